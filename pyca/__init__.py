@@ -2,5 +2,10 @@
 PYCA (Python Coverage Agent) - 业务无侵入的Python覆盖率上报插件
 """
 
+import logging
+
 __version__ = "0.1.0"
 
+# 库代码不配置根logger：默认丢弃pyca的日志，由CLI或sitecustomize按需添加输出
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
@@ -3,21 +3,95 @@ PYCA Agent - 覆盖率采集和上报核心模块
 """
 import os
 import sys
+import configparser
 import time
 import json
+import gzip
+import atexit
+import base64
 import hashlib
+import http.client
+import ipaddress
 import logging
+import queue
+import random
+import re
+import socket
 import threading
-import ast
-from typing import Dict, List, Set, Optional, Tuple
+import dis
+from array import array
+from itertools import chain
+from typing import Dict, FrozenSet, List, Set, Optional, Tuple
 from pathlib import Path
 import coverage
 from coverage.exceptions import NoSource
 import pika
-from urllib.parse import urlparse
+from urllib.parse import unquote, urlparse
+import urllib.request
 
 logger = logging.getLogger(__name__)
 
+# 单个区间hash（以及XOR得到的fingerprint）的字节数
+# fingerprint 只用于变化检测，不需要密码学强度，使用 16 字节的 blake2b
+FINGERPRINT_DIGEST_SIZE = 16
+
+# fingerprint hash 不用于安全目的：Python 3.9+ 传入 usedforsecurity=False，
+# 避免在启用 FIPS 模式的 OpenSSL 环境下被拒绝；更早的版本不支持该参数
+try:
+    hashlib.blake2b(usedforsecurity=False)
+    _FINGERPRINT_HASHER_KWARGS = {'digest_size': FINGERPRINT_DIGEST_SIZE, 'usedforsecurity': False}
+except TypeError:
+    _FINGERPRINT_HASHER_KWARGS = {'digest_size': FINGERPRINT_DIGEST_SIZE}
+
+
+def _new_fingerprint_hasher(data: bytes):
+    """创建用 data 初始化的 fingerprint hasher"""
+    return hashlib.blake2b(data, **_FINGERPRINT_HASHER_KWARGS)
+
+# 复用的 RabbitMQ 连接的最长使用时间（秒），超过后重建，避免长期占用可能已被中间设备悄悄断开的连接
+MQ_CONNECTION_RECYCLE_SECONDS = 3600
+
+# RabbitMQ 连接的心跳间隔（秒），以及上报线程空闲时处理连接事件（发送心跳）的间隔（秒）
+MQ_HEARTBEAT_SECONDS = 30
+MQ_IDLE_POLL_SECONDS = 1.0
+
+# RabbitMQ 主机名DNS解析结果的缓存时间（秒），解析失败的结果缓存较短时间
+DNS_CACHE_TTL_SECONDS = 300
+DNS_NEGATIVE_CACHE_TTL_SECONDS = 30
+
+# 待上报快照队列的最小容量（实际容量取该值与 mq_batch_size 的较大者，保证一批能合并 mq_batch_size 个快照）
+REPORT_QUEUE_MIN_SIZE = 4
+
+# 进程退出时等待上报线程处理完积压快照的最长时间（秒）
+EXIT_DRAIN_TIMEOUT_SECONDS = 2.0
+
+# 区间起止行打包用的 4 字节无符号整数 array 类型码（'I' 在个别平台上不是 4 字节）
+_RANGE_BOUND_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+
+
+def _pack_range_bounds(ranges: List[Tuple[int, int]]) -> array:
+    """将 [(start, end), ...] 打包为连续的 4 字节小端无符号整数数组（start0, end0, start1, end1, ...）"""
+    bounds = array(_RANGE_BOUND_TYPECODE, chain.from_iterable(ranges))
+    if sys.byteorder == 'big':
+        bounds.byteswap()
+    return bounds
+
+
+# GitHub 仓库 URL 格式（预编译，解析 repo URL 获取 owner/repo）
+# 支持格式: https://github.com/owner/repo, git@github.com:owner/repo, git://github.com/owner/repo
+_GITHUB_URL_PATTERNS = (
+    re.compile(r'(?i)^https?://github\.com/([^/]+)/([^/]+)/?$'),
+    re.compile(r'(?i)^git@github\.com:([^/]+)/([^/]+)/?$'),
+    re.compile(r'(?i)^git://github\.com/([^/]+)/([^/]+)/?$'),
+)
+
+# GitHub API 主机（获取 repo_id）
+GITHUB_API_HOST = 'api.github.com'
+
+# GitHub API 限流（403/429）时的最大请求次数，以及愿意等待限流解除的最长时间（秒）
+GITHUB_MAX_ATTEMPTS = 3
+GITHUB_RETRY_MAX_DELAY = 8.0
+
 # 尝试导入 dotenv，如果失败则忽略（向后兼容）
 try:
     from dotenv import load_dotenv
@@ -26,10 +100,94 @@ except ImportError:
     DOTENV_AVAILABLE = False
     logger.warning("[PYCA] python-dotenv not installed, .env file support disabled. Install with: pip install python-dotenv")
 
+# 尝试导入 orjson（C实现的JSON序列化，直接输出bytes），如果失败则回退到标准库 json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _dumps_json_bytes(obj) -> bytes:
+    """将上报消息序列化为 UTF-8 编码的 JSON bytes（优先使用 orjson）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+# numpy 为可选依赖，仅用于向量化区间压缩；延迟到首次采集时导入，避免拖慢每个解释器的启动
+_numpy = None
+
+# 行数少于该值时直接逐行扫描：构造数组和 tolist() 的固定开销在小文件上超过向量化收益
+_NUMPY_MIN_LINES = 4096
+
+
+def _load_numpy():
+    """返回 numpy 模块，未安装时返回 False"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+
+def _compress_sorted_lines(sorted_lines: List[int]) -> List[Tuple[int, int]]:
+    """
+    将已排序（无重复）的行号列表压缩为区间列表
+    
+    行数较多且安装了 numpy 时使用 diff 找出断点，一次性得到所有区间的起止行；否则逐行扫描
+    
+    Returns:
+        [(start_line, end_line), ...]
+    """
+    if len(sorted_lines) >= _NUMPY_MIN_LINES and _load_numpy():
+        np = _numpy
+        lines = np.fromiter(sorted_lines, dtype=np.int64, count=len(sorted_lines))
+        breaks = np.flatnonzero(np.diff(lines) != 1)
+        starts = np.concatenate((lines[:1], lines[breaks + 1]))
+        ends = np.concatenate((lines[breaks], lines[-1:]))
+        return list(zip(starts.tolist(), ends.tolist()))
+    
+    ranges = []
+    start = end = sorted_lines[0]
+    for line in sorted_lines[1:]:
+        if line == end + 1:
+            # 连续，扩展区间
+            end = line
+        else:
+            # 不连续，保存当前区间，开始新区间
+            ranges.append((start, end))
+            start = end = line
+    # 保存最后一个区间
+    ranges.append((start, end))
+    return ranges
+
+
+class _PublishInterrupted(Exception):
+    """发布一批消息时中途出现 AMQP 错误，published 为出错前已发布的消息数，原始异常见 __cause__"""
+    
+    def __init__(self, published: int):
+        super().__init__(published)
+        self.published = published
+
 
 class CoverageAgent:
     """覆盖率采集代理"""
     
+    # 定时采集路径上频繁访问的实例属性，使用 __slots__ 避免实例 __dict__ 查找
+    __slots__ = (
+        'config', 'rabbitmq_url', 'flush_interval', 'startup_delay', 'mq_compression', 'mq_durable', 'mq_batch_size', 'mq_batch_ms', 'fingerprint_file',
+        'cov', 'last_fingerprint', '_file_digest_cache', '_fp_xor', '_stmt_cache',
+        'timer', 'running', '_coverage_lock', '_coverage_started',
+        '_git_info', '_project_root_cache', '_analysis_format', '_strict_validation', '_statements_cache', 'repo_id_cache_file', '_repo_id_cache',
+        'path_mapping', '_mapped_path_cache', '_connection', '_channel',
+        '_report_queue', '_report_thread', '_github_conn', '_mq_params', '_mq_host', '_mq_properties', '_dns_cache', '_connection_opened_at',
+        '_last_line_counts', '_sorted_path_mapping', '_process_hooks_registered',
+    )
+    
     def __init__(self, config: Optional[Dict] = None):
         """
         初始化覆盖率代理
@@ -38,6 +196,12 @@ class CoverageAgent:
             config: 配置字典，包含以下可选键：
                 - rabbitmq_url: RabbitMQ连接URL (默认从环境变量PYCA_RABBITMQ_URL获取，如果未设置则使用默认值)
                 - flush_interval: 采集间隔（秒，默认60）
+                - startup_delay: 启动上报前等待的时间（秒，默认2，0表示立即上报）
+                - mq_compression: 上报消息压缩方式（默认不压缩，可选gzip）
+                - mq_durable: 是否以持久化方式发送上报消息（默认False）
+                - mq_batch_size: 上报线程一次合并发布的最大报告数（默认32）
+                - mq_batch_ms: 取到第一份报告后等待后续报告的时间（毫秒，默认0）
+                - strict: 是否对 coverage.analysis() 结果做完整类型校验（默认False，同 PYCA_STRICT）
                 - fingerprint_file: fingerprint存储文件路径（默认~/.pyca_fingerprint）
                 - path_mapping: 路径映射字典，格式 {host_path: container_path}，用于容器环境路径转换
                 - env_file: .env文件路径（默认自动查找项目根目录下的.env文件）
@@ -64,6 +228,53 @@ class CoverageAgent:
             '60'
         )
         self.flush_interval = int(flush_interval_str)
+        
+        # PYCA_STARTUP_DELAY: 启动上报前等待coverage收集初始数据的时间（秒），默认2；设置为0时立即上报
+        # （config 中的 0 是有效值，因此只在未设置时才回退到环境变量）
+        startup_delay = self.config.get('startup_delay')
+        if startup_delay is None:
+            startup_delay = os.getenv('PYCA_STARTUP_DELAY') or os.getenv('PCA_STARTUP_DELAY') or '2'
+        self.startup_delay = max(0.0, float(startup_delay))
+        
+        # PYCA_MQ_COMPRESSION: 上报消息的压缩方式，默认不压缩（保持与现有消费端兼容），设置为gzip时整包压缩
+        self.mq_compression = (
+            self.config.get('mq_compression') or
+            os.getenv('PYCA_MQ_COMPRESSION') or
+            os.getenv('PCA_MQ_COMPRESSION') or
+            ''
+        ).lower()
+        if self.mq_compression not in ('', 'gzip'):
+            logger.warning(f"[PYCA] Unsupported MQ compression '{self.mq_compression}', sending uncompressed reports")
+            self.mq_compression = ''
+        
+        # PYCA_MQ_DURABLE: 上报消息是否持久化（delivery_mode=2），默认不持久化：
+        # 覆盖率报告可以由下一次上报重新生成，持久化只会增加 broker 落盘开销
+        # （config 中的 False/0 是有效值，因此只在未设置时才回退到环境变量）
+        mq_durable = self.config.get('mq_durable')
+        if mq_durable is None:
+            mq_durable = os.getenv('PYCA_MQ_DURABLE') or os.getenv('PCA_MQ_DURABLE') or '0'
+        self.mq_durable = str(mq_durable).lower() in ('1', 'true', 'yes', 'on')
+        
+        # PYCA_MQ_BATCH_SIZE: 上报线程一次合并发布的最大快照数（默认32）；
+        # PYCA_MQ_BATCH_MS: 取到第一个快照后再等待后续快照的时间（毫秒，默认0，即只合并已积压的快照）
+        # （config 中的 0 是有效值，因此只在未设置时才回退到环境变量）
+        mq_batch_size = self.config.get('mq_batch_size')
+        if mq_batch_size is None:
+            mq_batch_size = os.getenv('PYCA_MQ_BATCH_SIZE') or os.getenv('PCA_MQ_BATCH_SIZE') or '32'
+        self.mq_batch_size = max(1, int(mq_batch_size))
+        # 快照每个采集周期最多产生一个，只有上报跟不上采集（如 broker 变慢）时队列中才会积压多个快照，
+        # 因此 mq_batch_ms 大于0时通常只会推迟上报，一般保持默认0即可
+        mq_batch_ms = self.config.get('mq_batch_ms')
+        if mq_batch_ms is None:
+            mq_batch_ms = os.getenv('PYCA_MQ_BATCH_MS') or os.getenv('PCA_MQ_BATCH_MS') or '0'
+        self.mq_batch_ms = max(0, int(mq_batch_ms))
+        
+        # 消息属性只由压缩和持久化配置决定，构建一次后每次发布复用
+        self._mq_properties = pika.BasicProperties(
+            content_type='application/json',
+            content_encoding='gzip' if self.mq_compression == 'gzip' else None,
+            delivery_mode=2 if self.mq_durable else 1  # 默认不持久化，见 PYCA_MQ_DURABLE
+        )
         self.fingerprint_file = Path(
             self.config.get('fingerprint_file') or 
             os.path.expanduser('~/.pyca_fingerprint')
@@ -85,6 +296,14 @@ class CoverageAgent:
         # 上次的fingerprint
         self.last_fingerprint = self._load_fingerprint()
         
+        # 增量fingerprint状态：每个文件的 (区间列表, 文件hash)，以及所有文件hash的XOR累积值
+        # hash以整数形式保存，XOR合并由 int 的C实现一次完成，无需逐字节循环
+        self._file_digest_cache: Dict[str, Tuple[List[Tuple[int, int]], int]] = {}
+        self._fp_xor = 0
+        
+        # 源文件可执行语句缓存：{filepath: (st_mtime_ns, st_size, statements)}，文件变化时自动失效
+        self._stmt_cache = {}
+        
         # 定时器
         self.timer = None
         self.running = False
@@ -93,9 +312,46 @@ class CoverageAgent:
         self._coverage_lock = threading.Lock()
         self._coverage_started = True  # 初始化时已启动
         
+        # RabbitMQ 连接参数（只解析一次URL），配置无效时为 None；_mq_host 保存URL中的原始主机名
+        self._mq_host = None
+        self._mq_params = self._build_mq_params() if self.rabbitmq_url else None
+        
+        # DNS解析缓存：{hostname: (ip 或 None, 解析时间)}，None 表示解析失败（负缓存）
+        self._dns_cache: Dict[str, Tuple[Optional[str], float]] = {}
+        
+        # RabbitMQ 连接和 channel（首次上报时建立，之后复用，超过 MQ_CONNECTION_RECYCLE_SECONDS 后重建；
+        # 上报线程运行时只由上报线程访问）
+        self._connection = None
+        self._channel = None
+        self._connection_opened_at = 0.0
+        
+        # 待上报的覆盖率快照队列（有界，满时丢弃最旧的快照）和上报线程：
+        # 获取Git信息/repo_id、格式化和发布到 broker 都在上报线程中完成，不阻塞定时采集线程
+        self._report_queue = self._new_report_queue()
+        self._report_thread = None
+        # atexit / fork 钩子只注册一次（多次 start() 不重复注册）
+        self._process_hooks_registered = False
+        
         # Git信息缓存
         self._git_info = None
         
+        # 项目根目录缓存（在agent生命周期内不变，首次使用时计算）
+        self._project_root_cache = None
+        
+        # coverage.analysis() 返回值格式（1或2），首次分析文件时检测，之后直接走对应的快速提取路径
+        self._analysis_format = None
+        # 严格校验模式（PYCA_STRICT=1 且未使用 -O 运行）：每个文件都执行完整的类型检查，用于排查数据问题
+        strict = self.config.get('strict')
+        if strict is None:
+            strict = os.environ.get('PYCA_STRICT') or '0'
+        self._strict_validation = __debug__ and str(strict).lower() in ('1', 'true', 'yes', 'on')
+        
+        # coverage.analysis() 结果缓存：{filename: ((st_mtime_ns, st_size), statements)}，statements 已去掉被排除的行
+        self._statements_cache = {}
+        
+        # GitHub API 的 HTTPS 连接（首次请求时建立，之后复用）
+        self._github_conn = None
+        
         # Repo ID 缓存文件路径（格式：{repo_url: repo_id}）
         self.repo_id_cache_file = Path(
             self.config.get('repo_id_cache_file') or 
@@ -113,6 +369,10 @@ class CoverageAgent:
             os.getenv('PCA_PATH_MAPPING')
         )
         self.path_mapping = {}
+        # 路径映射结果缓存：{filename: mapped_path}
+        self._mapped_path_cache = {}
+        # 上次 flush 时每个文件的已执行行数，用于空闲周期快速跳过
+        self._last_line_counts: Optional[Dict[str, int]] = None
         if path_mapping_str:
             if isinstance(path_mapping_str, dict):
                 # 如果直接传入字典
@@ -128,6 +388,10 @@ class CoverageAgent:
                 logger.info(f"[PYCA] Path mapping configured: {len(self.path_mapping)} mappings")
                 for host_path, container_path in list(self.path_mapping.items())[:3]:
                     logger.debug(f"[PYCA]   {host_path} -> {container_path}")
+        # 按路径长度从长到短预排序，优先匹配更具体的路径（映射在运行期不变，只需排序一次）
+        self._sorted_path_mapping: List[Tuple[str, str]] = sorted(
+            self.path_mapping.items(), key=lambda x: len(x[0]), reverse=True
+        )
         
         logger.info(f"[PYCA] Agent initialized, flush_interval={self.flush_interval}s")
     
@@ -151,14 +415,7 @@ class CoverageAgent:
             # 自动查找：优先从项目根目录（Git仓库根目录）查找，其次从当前工作目录
             # 查找 .git 目录来确定项目根目录
             cwd = os.getcwd()
-            git_dir = None
-            dir_path = Path(cwd)
-            while dir_path != dir_path.parent:
-                git_path = dir_path / ".git"
-                if git_path.exists():
-                    git_dir = str(git_path)
-                    break
-                dir_path = dir_path.parent
+            git_dir = self._find_git_dir(cwd)
             
             if git_dir:
                 project_root = os.path.dirname(git_dir)
@@ -246,6 +503,8 @@ class CoverageAgent:
         """
         将宿主机路径转换为容器内路径（如果配置了路径映射）
         
+        映射结果（包括未命中的结果）会被缓存，同一文件在后续采集中不再重复检查文件是否存在
+        
         Args:
             filename: 原始文件路径
             
@@ -255,10 +514,13 @@ class CoverageAgent:
         if not self.path_mapping:
             return filename
         
-        # 按路径长度从长到短排序，优先匹配更具体的路径
-        sorted_mappings = sorted(self.path_mapping.items(), key=lambda x: len(x[0]), reverse=True)
+        cached = self._mapped_path_cache.get(filename)
+        if cached is not None:
+            return cached
+        
+        result = filename
         
-        for host_path, container_path in sorted_mappings:
+        for host_path, container_path in self._sorted_path_mapping:
             # 确保路径以 / 结尾或完全匹配
             if filename.startswith(host_path):
                 # 替换路径前缀
@@ -266,16 +528,20 @@ class CoverageAgent:
                 # 检查转换后的路径是否存在
                 if os.path.exists(mapped_path):
                     logger.debug(f"[PYCA] Mapped path: {filename} -> {mapped_path}")
-                    return mapped_path
+                    result = mapped_path
+                    break
                 else:
                     logger.debug(f"[PYCA] Mapped path not found: {filename} -> {mapped_path} (file does not exist)")
         
-        return filename
+        self._mapped_path_cache[filename] = result
+        return result
     
-    def _parse_python_statements(self, filepath: str) -> Set[int]:
+    def _parse_python_statements(self, filepath: str) -> FrozenSet[int]:
         """
         解析 Python 文件，获取所有可执行语句的行号
         
+        结果按 (st_mtime_ns, st_size) 缓存，文件未变化时直接返回缓存，不再读取和解析源文件
+        
         Args:
             filepath: Python 文件路径
             
@@ -283,25 +549,29 @@ class CoverageAgent:
             可执行语句的行号集合
         """
         try:
+            st = os.stat(filepath)
+            cached = self._stmt_cache.get(filepath)
+            if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                return cached[2]
+            
             with open(filepath, 'r', encoding='utf-8') as f:
                 source = f.read()
             
-            tree = ast.parse(source, filename=filepath)
+            # 编译为字节码，直接读取行号表（与 coverage 判断可执行行的依据一致），
+            # 嵌套的函数、类等代码对象在 co_consts 中，需要逐层展开
             statements = set()
-            
-            for node in ast.walk(tree):
-                if hasattr(node, 'lineno') and node.lineno:
-                    # 记录所有有行号的节点（函数、类、语句等）
-                    statements.add(node.lineno)
-                    # 对于多行节点，也记录结束行
-                    if hasattr(node, 'end_lineno') and node.end_lineno:
-                        for line in range(node.lineno, node.end_lineno + 1):
-                            statements.add(line)
-            
+            code_objects = [compile(source, filepath, 'exec', dont_inherit=True)]
+            while code_objects:
+                code = code_objects.pop()
+                statements.update(line for _, line in dis.findlinestarts(code) if line)
+                code_objects.extend(const for const in code.co_consts if isinstance(const, type(code)))
+            
+            statements = frozenset(statements)
+            self._stmt_cache[filepath] = (st.st_mtime_ns, st.st_size, statements)
             return statements
         except Exception as e:
             logger.warning(f"[PYCA] Failed to parse Python file {filepath}: {e}")
-            return set()
+            return frozenset()
     
     def _scan_project_files(self) -> Dict[str, Dict[int, int]]:
         """
@@ -388,9 +658,17 @@ class CoverageAgent:
         """
         获取项目根目录（Git 仓库根目录或当前工作目录）
         
+        结果在首次调用时计算并缓存，之后的每次采集直接复用
+        
         Returns:
             项目根目录路径，如果找不到则返回 None
         """
+        if self._project_root_cache is None:
+            self._project_root_cache = self._get_project_root_impl()
+        return self._project_root_cache
+    
+    def _get_project_root_impl(self) -> Optional[str]:
+        """查找项目根目录（不使用缓存）"""
         # 优先查找 Git 仓库根目录
         cwd = os.getcwd()
         git_dir = self._find_git_dir(cwd)
@@ -450,6 +728,14 @@ class CoverageAgent:
             return
         
         self.running = True
+        # 启动上报线程（启动上报也通过它发送），进程退出时尽量发送完队列中的快照
+        self._start_report_worker()
+        if not self._process_hooks_registered:
+            self._process_hooks_registered = True
+            atexit.register(self._drain_on_exit)
+            # prefork 服务（如 gunicorn）的子进程会继承父进程的连接，见 _reset_after_fork
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=self._reset_after_fork)
         # 启动时立即上报一次覆盖率（不检查变化）
         self._report_on_startup()
         # 启动定时器
@@ -463,8 +749,117 @@ class CoverageAgent:
             self.timer.cancel()
         if self.cov:
             self._safe_stop_coverage()
+        if self._stop_report_worker():
+            self._close_connection()
+            self._close_github_connection()
         logger.info("[PYCA] Agent stopped")
     
+    def _start_report_worker(self):
+        """启动上报线程"""
+        if self._report_thread is not None and self._report_thread.is_alive():
+            return
+        self._report_thread = threading.Thread(
+            target=self._report_worker, name='pyca-report', daemon=True
+        )
+        self._report_thread.start()
+    
+    def _stop_report_worker(self, timeout: float = 5.0) -> bool:
+        """
+        通知上报线程处理完队列中的快照后退出
+        
+        Returns:
+            上报线程已退出（或从未启动）时返回 True，此时可以安全关闭连接
+        """
+        thread = self._report_thread
+        if thread is None or not thread.is_alive():
+            return True
+        self._put_drop_oldest(None)  # None 作为退出信号
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning("[PYCA] Report thread did not finish within %.1fs, leaving it to exit with the process", timeout)
+            return False
+        self._report_thread = None
+        return True
+    
+    def _reset_after_fork(self):
+        """
+        fork 出的子进程中丢弃从父进程继承的连接和上报线程
+        
+        继承的 socket 仍由父进程使用，这里只丢弃引用而不关闭，否则子进程退出时发送的
+        Connection.Close 会关闭父进程的连接；上报线程不会被 fork 复制，子进程使用新的队列，之后按需建立自己的连接
+        """
+        self._connection = None
+        self._channel = None
+        self._connection_opened_at = 0.0
+        self._github_conn = None
+        self._report_thread = None
+        self._report_queue = self._new_report_queue()
+    
+    def _new_report_queue(self) -> queue.Queue:
+        """创建待上报快照队列，容量不小于 mq_batch_size"""
+        return queue.Queue(maxsize=max(REPORT_QUEUE_MIN_SIZE, self.mq_batch_size))
+    
+    def _drain_on_exit(self):
+        """进程退出时（atexit）处理完队列中的快照并关闭连接，最多等待 EXIT_DRAIN_TIMEOUT_SECONDS，避免拖慢进程退出"""
+        if self._stop_report_worker(EXIT_DRAIN_TIMEOUT_SECONDS):
+            self._close_connection()
+            self._close_github_connection()
+    
+    def _report_worker(self):
+        """上报线程：独占 RabbitMQ 连接，每次唤醒时取出队列中已积压的快照（最多 mq_batch_size 个），通过同一个 channel 一起上报
+        
+        空闲时每 MQ_IDLE_POLL_SECONDS 处理一次连接事件，保证两次上报之间心跳不中断
+        """
+        while True:
+            try:
+                batch = [self._report_queue.get(timeout=MQ_IDLE_POLL_SECONDS)]
+            except queue.Empty:
+                self._process_connection_events()
+                continue
+            deadline = time.monotonic() + self.mq_batch_ms / 1000.0
+            while batch[-1] is not None and len(batch) < self.mq_batch_size:
+                try:
+                    remaining = deadline - time.monotonic()
+                    if remaining > 0:
+                        batch.append(self._report_queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._report_queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is None
+            if stopping:
+                batch.pop()
+            if batch:
+                self._report_snapshots(batch)  # 内部已捕获异常，不会抛出
+            if stopping:
+                break
+    
+    def _put_drop_oldest(self, item):
+        """放入上报队列，队列已满时丢弃最旧的快照（新的覆盖率数据总是包含旧数据）"""
+        while True:
+            try:
+                self._report_queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._report_queue.get_nowait()
+                    logger.warning("[PYCA] Report queue is full, dropped the oldest pending coverage snapshot")
+                except queue.Empty:
+                    pass
+    
+    def _submit_report(self, coverage_data: Dict,
+                       ranges: Optional[Dict[str, List[Tuple[int, int]]]] = None,
+                       not_executed_ranges: Optional[Dict[str, List[Tuple[int, int]]]] = None):
+        """
+        提交覆盖率快照：上报线程运行时交给它异步上报，否则在当前线程同步上报
+        
+        coverage_data 和区间每次采集都重新生成，采集线程提交后不再修改，可以直接作为快照
+        """
+        if self._report_thread is not None and self._report_thread.is_alive():
+            self._put_drop_oldest((coverage_data, ranges, not_executed_ranges))
+        else:
+            self._report_coverage(coverage_data, ranges, not_executed_ranges)
+    
     def _start_timer(self):
         """启动定时器"""
         if not self.running:
@@ -492,8 +887,8 @@ class CoverageAgent:
         
         # 延迟一小段时间，确保coverage能收集到初始数据
         # 但即使没有数据，也要上报（至少上报所有可执行的行，count=0）
-        import time
-        time.sleep(2)  # 等待0.5秒，让coverage有机会收集数据
+        if self.startup_delay:
+            time.sleep(self.startup_delay)  # 让coverage有机会收集数据，见 PYCA_STARTUP_DELAY
         
         # a. cov.stop()
         self._safe_stop_coverage()
@@ -502,6 +897,7 @@ class CoverageAgent:
             try:
                 # b. 生成 coverage data
                 coverage_data = self._get_coverage_data()
+                line_counts = self._collect_line_counts(self.cov.get_data())
                 
                 # 检查是否有数据
                 total_lines = sum(len(lines) for lines in coverage_data.values())
@@ -521,22 +917,20 @@ class CoverageAgent:
                     else:
                         logger.warning("[PYCA] Project scan returned no data, will report empty coverage")
                 
-                # c. 提取 executed_lines（用于更新fingerprint）
-                executed_lines = self._extract_executed_lines(coverage_data)
-                
-                # d. 行 → 区间压缩
-                ranges = self._compress_to_ranges(executed_lines)
+                # c/d. 提取 executed_lines 并压缩为区间（fingerprint 和上报格式化共用）
+                ranges, not_executed_ranges = self._compute_ranges_once(coverage_data)
                 
                 # e. 计算 fingerprint
                 fingerprint = self._calculate_fingerprint(ranges)
                 
                 # f. 直接上报（不检查变化，即使数据为空也要上报）
                 logger.info("[PYCA] Reporting coverage on startup (no change check)")
-                self._report_coverage(coverage_data)  # 内部已捕获异常，不会抛出
+                self._submit_report(coverage_data, ranges, not_executed_ranges)  # 内部已捕获异常，不会抛出
                 
                 # g. 更新 fingerprint
                 self.last_fingerprint = fingerprint
                 self._save_fingerprint(fingerprint)
+                self._last_line_counts = line_counts
             except Exception as e:
                 # 额外保护：即使 _report_coverage 内部有未捕获的异常，也不会影响服务启动
                 logger.error(f"[PYCA] Error in startup coverage report: {e}", exc_info=True)
@@ -547,6 +941,11 @@ class CoverageAgent:
         
         logger.info("[PYCA] Startup coverage report completed")
     
+    @staticmethod
+    def _collect_line_counts(data) -> Dict[str, int]:
+        """统计每个已测量文件的已执行行数（仅用于判断两次 flush 之间是否有新数据）"""
+        return {f: len(data.lines(f) or ()) for f in data.measured_files()}
+    
     def _flush_coverage(self):
         """采集并检查覆盖率"""
         logger.info("[PYCA] Starting coverage flush...")
@@ -566,6 +965,12 @@ class CoverageAgent:
             data = self.cov.get_data()
             logger.debug(f"[PYCA] Coverage data retrieved, measured files: {len(data.measured_files())}")
             
+            # 文件集合与每个文件的行数都未变化时，fingerprint 不可能变化，直接跳过
+            line_counts = self._collect_line_counts(data)
+            if line_counts == self._last_line_counts:
+                logger.info("[PYCA] Measured lines unchanged since last flush, skipping analysis")
+                return
+            
             # b. 生成 coverage data
             coverage_data = self._get_coverage_data()
             
@@ -573,12 +978,12 @@ class CoverageAgent:
             total_lines = sum(len(lines) for lines in coverage_data.values())
             logger.info(f"[PYCA] Coverage data collected: {len(coverage_data)} files, {total_lines} total lines")
             
-            # c. 提取 executed_lines
-            executed_lines = self._extract_executed_lines(coverage_data)
+            # c/d. 提取 executed_lines 并压缩为区间（fingerprint 和上报格式化共用，每个文件只处理一次）
+            ranges, not_executed_ranges = self._compute_ranges_once(coverage_data)
             
             # 记录已执行的文件和行数
-            total_executed_lines = sum(len(lines) for lines in executed_lines.values())
-            logger.info(f"[PYCA] Executed lines: {len(executed_lines)} files, {total_executed_lines} total executed lines")
+            total_executed_lines = sum(end - start + 1 for file_ranges in ranges.values() for start, end in file_ranges)
+            logger.info(f"[PYCA] Executed lines: {len(ranges)} files, {total_executed_lines} total executed lines")
             
             # 如果执行行数为0但有覆盖率数据，记录警告
             if total_executed_lines == 0 and total_lines > 0:
@@ -586,9 +991,6 @@ class CoverageAgent:
                 # 即使没有执行行，也尝试上报（至少上报可执行的行，count=0）
                 # 这样可以确保系统知道哪些代码是可执行的，即使还没有被执行
             
-            # d. 行 → 区间压缩
-            ranges = self._compress_to_ranges(executed_lines)
-            
             # e. 计算 fingerprint
             fingerprint = self._calculate_fingerprint(ranges)
             
@@ -608,7 +1010,7 @@ class CoverageAgent:
                 # 执行行数为0但有覆盖率数据，可能是代码还未执行
                 # 为了确保系统知道哪些代码是可执行的，我们也应该上报一次
                 # 但为了避免重复上报，我们检查是否已经上报过空指纹
-                empty_fingerprint = "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"  # 空字符串的SHA256
+                empty_fingerprint = '0' * (2 * FINGERPRINT_DIGEST_SIZE)  # 没有任何区间时XOR累积值为全0
                 if fingerprint == empty_fingerprint and self.last_fingerprint == empty_fingerprint:
                     # 这是空数据的hash，如果上次也是这个，说明已经上报过了
                     logger.info(f"[PYCA] Coverage unchanged (no executed lines), skipping report (fingerprint: {fingerprint[:16]}...)")
@@ -619,13 +1021,17 @@ class CoverageAgent:
             else:
                 logger.info(f"[PYCA] Coverage unchanged, skipping report (fingerprint matches: {fingerprint[:16] if fingerprint else 'None'}...)")
             
+            if not should_report:
+                self._last_line_counts = line_counts
+            
             if should_report:
                 # g. 上报（内部已捕获异常，不会抛出）
                 try:
-                    self._report_coverage(coverage_data)
+                    self._submit_report(coverage_data, ranges, not_executed_ranges)
                     # h. 更新 fingerprint（只有上报成功才更新）
                     self.last_fingerprint = fingerprint
                     self._save_fingerprint(fingerprint)
+                    self._last_line_counts = line_counts
                 except Exception as e:
                     # 额外保护：即使 _report_coverage 内部有未捕获的异常，也不会影响服务运行
                     logger.error(f"[PYCA] Error reporting coverage in flush: {e}", exc_info=True)
@@ -648,136 +1054,71 @@ class CoverageAgent:
         
         coverage_data = {}
         measured_files = data.measured_files()
-        logger.info(f"[PYCA] Found {len(measured_files)} measured files")
+        logger.info("[PYCA] Found %d measured files", len(measured_files))
         
-        # 检查是否有已执行的文件
-        files_with_executed_lines = []
-        for filename in measured_files:
-            lines = data.lines(filename)
-            if lines:
-                files_with_executed_lines.append(filename)
-        logger.info(f"[PYCA] Files with executed lines: {len(files_with_executed_lines)}/{len(measured_files)}")
+        # 检查是否有已执行的文件（仅用于日志，INFO 未开启时跳过整轮统计）
+        if logger.isEnabledFor(logging.INFO):
+            files_with_executed_lines = sum(1 for filename in measured_files if data.lines(filename))
+            logger.info("[PYCA] Files with executed lines: %d/%d", files_with_executed_lines, len(measured_files))
         
         if not measured_files:
             logger.warning("[PYCA] No measured files found, coverage may not be collecting data")
             # 尝试获取所有已执行的文件
             all_files = list(data.measured_files())
             if all_files:
-                logger.info(f"[PYCA] But found {len(all_files)} files in coverage data")
+                logger.info("[PYCA] But found %d files in coverage data", len(all_files))
             else:
                 logger.warning("[PYCA] Coverage data is empty - no code has been executed yet")
         
         for filename in measured_files:
             try:
-                # 使用 Coverage 对象的 analysis 方法获取分析结果
-                # 不同版本的 coverage 库返回的元组格式可能不同：
-                # 格式1: (statements, excluded, missing, missing_branch, excluded_branch) - 标准格式
-                # 格式2: (filename, statements, missing, missing_str) - 某些版本的格式
-                # 注意：coverage.analysis() 需要使用 coverage 数据中记录的文件名
-                analysis_result = self.cov.analysis(filename)
-                
-                # 检测返回格式：如果第一个元素是字符串（文件名），说明是格式2
-                if len(analysis_result) >= 3 and isinstance(analysis_result[0], str):
-                    # 格式2: (filename, statements, missing, ...)
-                    logger.info(f"[PYCA] Detected analysis format 2: (filename, statements, missing, ...)")
-                    statements = analysis_result[1]  # 所有可执行的行号列表
-                    missing = analysis_result[2]     # 未执行的行号列表
-                    excluded = set()  # 格式2 中没有 excluded 信息，使用空集合
-                    logger.info(f"[PYCA]   statements type: {type(statements)}, missing type: {type(missing)}")
-                elif len(analysis_result) >= 3:
-                    # 格式1: (statements, excluded, missing, ...)
-                    logger.info(f"[PYCA] Detected analysis format 1: (statements, excluded, missing, ...)")
-                    statements = analysis_result[0]  # 所有可执行的行号集合
-                    excluded = analysis_result[1]    # 被排除的行号集合
-                    missing = analysis_result[2]     # 未执行的行号集合
+                # 可执行语句只依赖源文件内容，按文件 (mtime, size) 缓存（与 _stmt_cache 一致），源文件未修改时跳过 analysis()
+                try:
+                    st = os.stat(filename)
+                    file_key = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    file_key = None
+                cached = self._statements_cache.get(filename)
+                if cached is not None and file_key is not None and cached[0] == file_key:
+                    effective = cached[1]
                 else:
-                    # 如果返回值格式不符合预期，回退到简单方法
-                    logger.error(f"[PYCA] ERROR: Unexpected analysis result format: {len(analysis_result)} values")
-                    logger.error(f"[PYCA]   analysis_result: {analysis_result}")
-                    raise ValueError(f"Unexpected analysis result format: {len(analysis_result)} values")
-                
-                # 验证 statements 的类型
-                if not isinstance(statements, (set, list, tuple)):
-                    logger.error(f"[PYCA] ERROR: statements is not a collection! Type: {type(statements)}, value: {statements}")
-                    logger.error(f"[PYCA]   This is a critical bug - statements should be a set/list of line numbers")
-                    logger.error(f"[PYCA]   analysis_result: {analysis_result}")
-                    # 如果 statements 是字符串（文件名），说明 analysis 返回格式错误
-                    if isinstance(statements, str):
-                        logger.error(f"[PYCA]   statements is a string (filename?), this indicates analysis() returned wrong format")
-                        # 尝试从 analysis_result 中提取正确的数据
-                        if len(analysis_result) >= 2 and isinstance(analysis_result[1], (list, tuple, set)):
-                            logger.warning(f"[PYCA]   Attempting to extract statements from analysis_result[1]")
-                            statements = analysis_result[1]
-                        else:
-                            raise ValueError(f"analysis() returned invalid format: statements is a string '{statements[:50]}...'")
-                    else:
-                        continue
-                
-                # 确保 statements 是集合类型
-                if isinstance(statements, (list, tuple)):
-                    statements = set(statements)
-                elif not isinstance(statements, set):
-                    # 如果不是集合、列表或元组，尝试转换
-                    try:
-                        statements = set(statements)
-                    except TypeError:
-                        logger.error(f"[PYCA] ERROR: Cannot convert statements to set. Type: {type(statements)}, value: {statements}")
+                    analyzed = self._analyze_statements(filename)
+                    if analyzed is None:
                         continue
-                
-                # 确保 excluded 是集合类型
-                if isinstance(excluded, (list, tuple)):
-                    excluded = set(excluded)
-                elif not isinstance(excluded, set):
-                    excluded = set()
-                
-                # 确保 missing 是集合类型（用于日志）
-                if isinstance(missing, (list, tuple)):
-                    missing_set = set(missing)
-                elif isinstance(missing, set):
-                    missing_set = missing
-                else:
-                    missing_set = set()
-                
-                # 验证 statements 中的元素都是整数
-                if statements and not all(isinstance(s, int) for s in list(statements)[:10]):
-                    sample_statements = list(statements)[:10]
-                    logger.error(f"[PYCA] ERROR: statements contains non-integer values! Sample: {sample_statements}")
-                    logger.error(f"[PYCA]   Types: {[type(s) for s in sample_statements]}")
-                    logger.error(f"[PYCA]   This indicates analysis() returned wrong format")
-                    # 过滤掉非整数元素
-                    statements = {s for s in statements if isinstance(s, int)}
-                    logger.warning(f"[PYCA]   Filtered statements to {len(statements)} integer line numbers")
+                    statements, excluded = analyzed
+                    effective = frozenset(statements - excluded)
+                    if file_key is not None:
+                        self._statements_cache[filename] = (file_key, effective)
                 
                 # 获取已执行的行
                 executed_lines = set(data.lines(filename))
                 
                 # 添加调试日志
-                logger.info(f"[PYCA] Analyzing {filename}: {len(statements)} statements, {len(executed_lines)} executed lines, {len(missing_set)} missing lines")
-                if len(executed_lines) == 0 and len(statements) > 0:
-                    logger.warning(f"[PYCA] WARNING: File {filename} has {len(statements)} statements but 0 executed lines - code may not have been executed")
+                logger.info("[PYCA] Analyzing %s: %d statements, %d executed lines",
+                            filename, len(effective), len(executed_lines))
+                if not executed_lines and effective:
+                    logger.warning("[PYCA] WARNING: File %s has %d statements but 0 executed lines - code may not have been executed",
+                                   filename, len(effective))
                 
                 # 构建覆盖率数据：{line_number: count}
-                # statements 包含所有可执行的行（包括已执行和未执行的）
-                file_coverage = {}
-                for line_num in statements:
-                    # 排除被排除的行
-                    if line_num in excluded:
-                        continue
-                    # 如果行已执行，count = 1
-                    # 如果行未执行，count = 0
-                    if line_num in executed_lines:
-                        file_coverage[line_num] = 1
-                    else:
-                        file_coverage[line_num] = 0
+                # effective 为去掉被排除行后的所有可执行行（包括已执行和未执行的），
+                # 已执行的行 count = 1，未执行的行 count = 0（集合运算，避免逐行判断）
+                covered = effective & executed_lines
+                file_coverage = dict.fromkeys(covered, 1)
+                file_coverage.update(dict.fromkeys(effective - covered, 0))
                 
                 if file_coverage:
                     # 确保 file_coverage 的结构正确：{line_number: count}
                     # 添加验证和日志
-                    sample_keys = list(file_coverage.keys())[:5]
-                    logger.info(f"[PYCA] File {filename}: file_coverage sample keys: {sample_keys}, types: {[type(k) for k in sample_keys]}")
+                    if logger.isEnabledFor(logging.INFO):
+                        sample_keys = list(file_coverage)[:5]
+                        logger.info("[PYCA] File %s: file_coverage sample keys: %s, types: %s",
+                                    filename, sample_keys, [type(k) for k in sample_keys])
                     
-                    # 验证：所有键应该是整数
-                    invalid_keys = [k for k in file_coverage.keys() if not isinstance(k, int)]
+                    # 验证：所有键应该是整数（仅严格校验模式）
+                    invalid_keys = None
+                    if self._strict_validation:
+                        invalid_keys = [k for k in file_coverage.keys() if not isinstance(k, int)]
                     if invalid_keys:
                         logger.error(f"[PYCA] ERROR: file_coverage has non-integer keys! First few: {invalid_keys[:10]}")
                         logger.error(f"[PYCA]   This indicates a bug in data construction. Expected line numbers (int), got: {[type(k) for k in invalid_keys[:5]]}")
@@ -786,20 +1127,20 @@ class CoverageAgent:
                         logger.warning(f"[PYCA]   Fixed: removed {len(invalid_keys)} invalid keys, kept {len(file_coverage)} valid keys")
                     
                     coverage_data[filename] = file_coverage
-                    executed_count = sum(1 for count in file_coverage.values() if count > 0)
-                    logger.info(f"[PYCA] File {filename}: {len(statements)} statements, {executed_count} executed, {len(file_coverage) - executed_count} not executed")
+                    logger.info("[PYCA] File %s: %d statements, %d executed, %d not executed",
+                                filename, len(effective), len(covered), len(file_coverage) - len(covered))
                 else:
-                    logger.info(f"[PYCA] File {filename}: no coverage data (all lines excluded or no statements)")
+                    logger.info("[PYCA] File %s: no coverage data (all lines excluded or no statements)", filename)
             except NoSource as e:
                 # 源文件不存在（常见于容器环境，源文件不在容器内）
-                logger.info(f"[PYCA] Source file not available for {filename}: {e}")
+                logger.info("[PYCA] Source file not available for %s: %s", filename, e)
                 
                 # 尝试路径映射：如果配置了路径映射，尝试用映射后的路径读取源文件
                 mapped_filename = self._map_path(filename)
                 if mapped_filename != filename and os.path.exists(mapped_filename):
                     # 映射后的文件存在，尝试解析获取所有可执行语句
                     try:
-                        logger.debug(f"[PYCA] Trying mapped path: {mapped_filename}")
+                        logger.debug("[PYCA] Trying mapped path: %s", mapped_filename)
                         # 使用 AST 解析 Python 文件获取所有可执行语句
                         statements = self._parse_python_statements(mapped_filename)
                         
@@ -808,129 +1149,234 @@ class CoverageAgent:
                             executed_lines = set(data.lines(filename))
                             
                             # 构建覆盖率数据
-                            file_coverage = {}
-                            for line_num in statements:
-                                file_coverage[line_num] = 1 if line_num in executed_lines else 0
+                            covered = statements & executed_lines
+                            file_coverage = dict.fromkeys(covered, 1)
+                            file_coverage.update(dict.fromkeys(statements - covered, 0))
                             
                             coverage_data[filename] = file_coverage
-                            executed_count = sum(1 for count in file_coverage.values() if count > 0)
-                            logger.debug(f"[PYCA] Mapped path analysis: {filename} -> {mapped_filename}: {len(statements)} statements, {executed_count} executed")
+                            logger.debug("[PYCA] Mapped path analysis: %s -> %s: %d statements, %d executed",
+                                         filename, mapped_filename, len(statements), len(covered))
                         else:
                             # 如果解析失败，回退到只记录已执行的行
                             lines = data.lines(filename)
                             if lines:
                                 coverage_data[filename] = {line: 1 for line in lines}
-                                logger.debug(f"[PYCA] Fallback: File {filename}: {len(lines)} executed lines (from data.lines)")
+                                logger.debug("[PYCA] Fallback: File %s: %d executed lines (from data.lines)", filename, len(lines))
                     except Exception as map_error:
-                        logger.debug(f"[PYCA] Mapped path analysis failed: {map_error}")
+                        logger.debug("[PYCA] Mapped path analysis failed: %s", map_error)
                         # 回退到只记录已执行的行
                         lines = data.lines(filename)
                         if lines:
                             coverage_data[filename] = {line: 1 for line in lines}
-                            logger.debug(f"[PYCA] Fallback: File {filename}: {len(lines)} executed lines (from data.lines)")
+                            logger.debug("[PYCA] Fallback: File %s: %d executed lines (from data.lines)", filename, len(lines))
                         else:
-                            logger.debug(f"[PYCA] Fallback: File {filename}: no executed lines found")
+                            logger.debug("[PYCA] Fallback: File %s: no executed lines found", filename)
                 else:
                     # 没有路径映射或映射后的文件也不存在，回退到只记录已执行的行
                     lines = data.lines(filename)
                     if lines:
                         coverage_data[filename] = {line: 1 for line in lines}
-                        logger.debug(f"[PYCA] Fallback: File {filename}: {len(lines)} executed lines (from data.lines)")
+                        logger.debug("[PYCA] Fallback: File %s: %d executed lines (from data.lines)", filename, len(lines))
                     else:
-                        logger.debug(f"[PYCA] Fallback: File {filename}: no executed lines found")
+                        logger.debug("[PYCA] Fallback: File %s: no executed lines found", filename)
             except Exception as e:
-                logger.error(f"[PYCA] Failed to analyze {filename}: {e}", exc_info=True)
+                logger.error("[PYCA] Failed to analyze %s: %s", filename, e, exc_info=True)
                 # 如果分析失败，回退到只记录已执行的行
                 lines = data.lines(filename)
                 if lines:
                     coverage_data[filename] = {line: 1 for line in lines}
-                    logger.info(f"[PYCA] Fallback: File {filename}: {len(lines)} executed lines (from data.lines)")
+                    logger.info("[PYCA] Fallback: File %s: %d executed lines (from data.lines)", filename, len(lines))
                 else:
-                    logger.warning(f"[PYCA] Fallback: File {filename}: no executed lines found")
+                    logger.warning("[PYCA] Fallback: File %s: no executed lines found", filename)
         
         # 将所有绝对路径转换为相对路径
         project_root = self._get_project_root()
         if project_root:
-            logger.debug(f"[PYCA] Converting absolute paths to relative paths (project root: {project_root})")
+            logger.debug("[PYCA] Converting absolute paths to relative paths (project root: %s)", project_root)
+            # coverage 记录的文件名已是规范化的绝对路径，只需一次前缀比较和截取，
+            # 无需对每个文件调用 abspath/relpath
+            root_prefix = os.path.abspath(project_root).rstrip(os.sep) + os.sep
+            prefix_len = len(root_prefix)
             normalized_coverage_data = {}
             for filename, line_coverage in coverage_data.items():
-                relative_filename = self._to_relative_path(filename, project_root)
-                if relative_filename != filename:
-                    logger.debug(f"[PYCA] Converted path: {filename} -> {relative_filename}")
-                normalized_coverage_data[relative_filename] = line_coverage
+                if filename.startswith(root_prefix):
+                    filename = filename[prefix_len:].replace(os.sep, '/')
+                normalized_coverage_data[filename] = line_coverage
             coverage_data = normalized_coverage_data
         else:
-            logger.debug(f"[PYCA] Could not determine project root, keeping original paths")
-        
-        # 验证返回的数据结构
-        logger.debug(f"[PYCA] _get_coverage_data returning {len(coverage_data)} files")
-        for filename, line_coverage in list(coverage_data.items())[:3]:
-            if not isinstance(line_coverage, dict):
-                logger.error(f"[PYCA] ERROR: Invalid coverage_data structure! filename={filename}, line_coverage type={type(line_coverage)}")
-            else:
-                sample_keys = list(line_coverage.keys())[:5]
-                if sample_keys and not all(isinstance(k, int) for k in sample_keys):
-                    logger.error(f"[PYCA] ERROR: Invalid keys in coverage_data! filename={filename}, sample keys={sample_keys}, types={[type(k) for k in sample_keys]}")
+            logger.debug("[PYCA] Could not determine project root, keeping original paths")
+        
+        # 验证返回的数据结构（仅严格校验模式）
+        logger.debug("[PYCA] _get_coverage_data returning %d files", len(coverage_data))
+        if self._strict_validation:
+            for filename, line_coverage in list(coverage_data.items())[:3]:
+                if not isinstance(line_coverage, dict):
+                    logger.error(f"[PYCA] ERROR: Invalid coverage_data structure! filename={filename}, line_coverage type={type(line_coverage)}")
+                else:
+                    sample_keys = list(line_coverage.keys())[:5]
+                    if sample_keys and not all(isinstance(k, int) for k in sample_keys):
+                        logger.error(f"[PYCA] ERROR: Invalid keys in coverage_data! filename={filename}, sample keys={sample_keys}, types={[type(k) for k in sample_keys]}")
         
         return coverage_data
     
-    def _extract_executed_lines(self, coverage_data: Dict) -> Dict[str, Set[int]]:
+    def _analyze_statements(self, filename: str) -> Optional[Tuple[Set[int], Set[int]]]:
         """
-        提取已执行的行（用于fingerprint计算）
+        调用 coverage.analysis() 获取文件的可执行语句和被排除的行
         
         Args:
-            coverage_data: 覆盖率数据字典 {filename: {line_number: count, ...}}
+            filename: coverage 数据中记录的文件名
         
         Returns:
-            {filename: set(executed_lines)} - 只包含count > 0的行
+            (statements, excluded)，analysis() 返回的数据无法使用时返回 None
+        
+        Raises:
+            NoSource: 源文件不存在
         """
-        executed_lines = {}
-        for filename, line_coverage in coverage_data.items():
-            # 只提取count > 0的行（已执行的行）
-            executed = {line for line, count in line_coverage.items() if count > 0}
-            if executed:
-                executed_lines[filename] = executed
-        return executed_lines
+        # 使用 Coverage 对象的 analysis 方法获取分析结果
+        # 不同版本的 coverage 库返回的元组格式可能不同：
+        # 格式1: (statements, excluded, missing, missing_branch, excluded_branch) - 标准格式
+        # 格式2: (filename, statements, missing, missing_str) - 某些版本的格式
+        # 注意：coverage.analysis() 需要使用 coverage 数据中记录的文件名
+        analysis_result = self.cov.analysis(filename)
+        
+        # 同一个 coverage 库返回的格式始终一致：首次检测后直接走无类型检查的快速路径
+        if self._analysis_format == 2 and not self._strict_validation:
+            return self._extract_fast_format2(analysis_result)
+        if self._analysis_format == 1 and not self._strict_validation:
+            return self._extract_fast_format1(analysis_result)
+        return self._analyze_statements_strict(analysis_result)
+    
+    @staticmethod
+    def _extract_fast_format1(analysis_result) -> Tuple[Set[int], Set[int]]:
+        """格式1: (statements, excluded, missing, ...)"""
+        return set(analysis_result[0]), set(analysis_result[1])
     
-    def _compress_to_ranges(self, executed_lines: Dict[str, Set[int]]) -> Dict[str, List[Tuple[int, int]]]:
+    @staticmethod
+    def _extract_fast_format2(analysis_result) -> Tuple[Set[int], Set[int]]:
+        """格式2: (filename, statements, missing, ...)，没有 excluded 信息"""
+        return set(analysis_result[1]), set()
+    
+    def _analyze_statements_strict(self, analysis_result) -> Optional[Tuple[Set[int], Set[int]]]:
         """
-        将行号压缩为区间
+        带完整类型校验的 analysis() 结果解析，用于首次检测返回格式以及严格校验模式
         
         Args:
-            executed_lines: {filename: set(executed_lines)}
+            analysis_result: coverage.analysis() 的返回值
         
         Returns:
-            {filename: [(start_line, end_line), ...]}
+            (statements, excluded)，analysis() 返回的数据无法使用时返回 None
         """
-        ranges = {}
-        for filename, lines in executed_lines.items():
-            if not lines:
-                continue
-            
-            sorted_lines = sorted(lines)
-            file_ranges = []
-            start = sorted_lines[0]
-            end = sorted_lines[0]
-            
-            for line in sorted_lines[1:]:
-                if line == end + 1:
-                    # 连续，扩展区间
-                    end = line
+        # 检测返回格式：如果第一个元素是字符串（文件名），说明是格式2
+        if len(analysis_result) >= 3 and isinstance(analysis_result[0], str):
+            # 格式2: (filename, statements, missing, ...)
+            statements = analysis_result[1]  # 所有可执行的行号列表
+            excluded = set()  # 格式2 中没有 excluded 信息，使用空集合
+            if self._analysis_format != 2:
+                # 格式在 agent 生命周期内不变，只在首次检测到时记录
+                self._analysis_format = 2
+                logger.info("[PYCA] Detected analysis format 2: (filename, statements, missing, ...), statements type: %s",
+                            type(statements).__name__)
+        elif len(analysis_result) >= 3:
+            # 格式1: (statements, excluded, missing, ...)
+            if self._analysis_format != 1:
+                self._analysis_format = 1
+                logger.info("[PYCA] Detected analysis format 1: (statements, excluded, missing, ...)")
+            statements = analysis_result[0]  # 所有可执行的行号集合
+            excluded = analysis_result[1]    # 被排除的行号集合
+        else:
+            # 如果返回值格式不符合预期，回退到简单方法
+            logger.error(f"[PYCA] ERROR: Unexpected analysis result format: {len(analysis_result)} values")
+            logger.error(f"[PYCA]   analysis_result: {analysis_result}")
+            raise ValueError(f"Unexpected analysis result format: {len(analysis_result)} values")
+        
+        # 验证 statements 的类型
+        if not isinstance(statements, (set, list, tuple)):
+            logger.error(f"[PYCA] ERROR: statements is not a collection! Type: {type(statements)}, value: {statements}")
+            logger.error(f"[PYCA]   This is a critical bug - statements should be a set/list of line numbers")
+            logger.error(f"[PYCA]   analysis_result: {analysis_result}")
+            # 如果 statements 是字符串（文件名），说明 analysis 返回格式错误
+            if isinstance(statements, str):
+                logger.error(f"[PYCA]   statements is a string (filename?), this indicates analysis() returned wrong format")
+                # 尝试从 analysis_result 中提取正确的数据
+                if len(analysis_result) >= 2 and isinstance(analysis_result[1], (list, tuple, set)):
+                    logger.warning(f"[PYCA]   Attempting to extract statements from analysis_result[1]")
+                    statements = analysis_result[1]
                 else:
-                    # 不连续，保存当前区间，开始新区间
-                    file_ranges.append((start, end))
-                    start = line
-                    end = line
-            
-            # 保存最后一个区间
-            file_ranges.append((start, end))
-            ranges[filename] = file_ranges
+                    raise ValueError(f"analysis() returned invalid format: statements is a string '{statements[:50]}...'")
+            else:
+                return None
+        
+        # 确保 statements 是集合类型
+        if isinstance(statements, (list, tuple)):
+            statements = set(statements)
+        elif not isinstance(statements, set):
+            # 如果不是集合、列表或元组，尝试转换
+            try:
+                statements = set(statements)
+            except TypeError:
+                logger.error(f"[PYCA] ERROR: Cannot convert statements to set. Type: {type(statements)}, value: {statements}")
+                return None
+        
+        # 确保 excluded 是集合类型
+        if isinstance(excluded, (list, tuple)):
+            excluded = set(excluded)
+        elif not isinstance(excluded, set):
+            excluded = set()
+        
+        # 验证 statements 中的元素都是整数
+        if statements and not all(isinstance(s, int) for s in list(statements)[:10]):
+            sample_statements = list(statements)[:10]
+            logger.error(f"[PYCA] ERROR: statements contains non-integer values! Sample: {sample_statements}")
+            logger.error(f"[PYCA]   Types: {[type(s) for s in sample_statements]}")
+            logger.error(f"[PYCA]   This indicates analysis() returned wrong format")
+            # 过滤掉非整数元素
+            statements = {s for s in statements if isinstance(s, int)}
+            logger.warning(f"[PYCA]   Filtered statements to {len(statements)} integer line numbers")
+        
+        return statements, excluded
+    
+    def _compute_ranges_once(self, coverage_data: Dict) -> Tuple[Dict[str, List[Tuple[int, int]]],
+                                                                  Dict[str, List[Tuple[int, int]]]]:
+        """
+        将每个文件的行按是否执行分组并压缩为区间，每个文件只遍历和排序一次
+        
+        已执行区间同时用于 fingerprint 计算和上报格式化，未执行区间用于上报格式化，
+        _format_coverage_raw 不再重复分组、排序和压缩
+        
+        Args:
+            coverage_data: 覆盖率数据字典 {filename: {line_number: count, ...}}
         
-        return ranges
+        Returns:
+            (executed_ranges, not_executed_ranges)，均为 {filename: [(start_line, end_line), ...]}，
+            只包含对应行非空的文件
+        """
+        executed_ranges = {}
+        not_executed_ranges = {}
+        for filename, line_coverage in coverage_data.items():
+            # 按count分组：已执行（count>0）和未执行（count=0），行号本身无重复，排序后直接压缩
+            executed = []
+            not_executed = []
+            for line, count in line_coverage.items():
+                if count > 0:
+                    executed.append(line)
+                else:
+                    not_executed.append(line)
+            if executed:
+                executed.sort()
+                executed_ranges[filename] = _compress_sorted_lines(executed)
+            if not_executed:
+                not_executed.sort()
+                not_executed_ranges[filename] = _compress_sorted_lines(not_executed)
+        return executed_ranges, not_executed_ranges
     
     def _calculate_fingerprint(self, ranges: Dict[str, List[Tuple[int, int]]]) -> str:
         """
-        计算区间级hash fingerprint
+        计算文件级hash fingerprint（增量XOR）
+        
+        每个文件对应一个稳定的blake2b hash（文件名 + 所有区间的固定宽度起止行），
+        全局fingerprint为所有文件hash的XOR。
+        文件hash按区间列表缓存：区间未变化的文件直接复用上次的hash，只有区间变化的文件需要重新计算，
+        消失的文件将其hash从累积值中XOR移除。
         
         Args:
             ranges: {filename: [(start_line, end_line), ...]}
@@ -938,18 +1384,29 @@ class CoverageAgent:
         Returns:
             fingerprint字符串
         """
-        # 构建用于hash的字符串
-        # 格式: filename:start-end,start-end;filename:start-end,...
-        parts = []
-        for filename in sorted(ranges.keys()):
-            range_strs = [f"{start}-{end}" for start, end in sorted(ranges[filename])]
-            parts.append(f"{filename}:{','.join(range_strs)}")
+        cache = self._file_digest_cache
+        fp_xor = self._fp_xor
         
-        content = ";".join(parts)
+        # 移除已消失的文件
+        for filename in cache.keys() - ranges.keys():
+            fp_xor ^= cache.pop(filename)[1]
         
-        # 计算hash
-        hash_obj = hashlib.sha256(content.encode('utf-8'))
-        return hash_obj.hexdigest()
+        for filename, file_ranges in ranges.items():
+            cached = cache.get(filename)
+            if cached is not None:
+                if cached[0] == file_ranges:
+                    continue
+                # 区间发生变化，先移除旧hash
+                fp_xor ^= cached[1]
+            # 所有区间的起止行一次性打包为 4 字节小端无符号整数数组，整体写入 hasher
+            hasher = _new_fingerprint_hasher(filename.encode('utf-8'))
+            hasher.update(_pack_range_bounds(file_ranges))
+            file_hash = int.from_bytes(hasher.digest(), 'big')
+            cache[filename] = (file_ranges, file_hash)
+            fp_xor ^= file_hash
+        
+        self._fp_xor = fp_xor
+        return fp_xor.to_bytes(FINGERPRINT_DIGEST_SIZE, 'big').hex()
     
     def _load_fingerprint(self) -> Optional[str]:
         """加载上次的fingerprint"""
@@ -962,132 +1419,130 @@ class CoverageAgent:
         return None
     
     def _save_fingerprint(self, fingerprint: str):
-        """保存fingerprint"""
+        """保存fingerprint
+        
+        先写临时文件并 fsync，再原子替换，进程在写入过程中被杀掉也不会留下不完整的fingerprint
+        """
         try:
             self.fingerprint_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.fingerprint_file, 'w') as f:
+            tmp_file = self.fingerprint_file.with_name(f"{self.fingerprint_file.name}.{os.getpid()}.tmp")
+            with open(tmp_file, 'w') as f:
                 f.write(fingerprint)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.fingerprint_file)
         except Exception as e:
             logger.error(f"[PYCA] Failed to save fingerprint: {e}")
     
-    def _report_coverage(self, coverage_data: Dict):
+    def _report_coverage(self, coverage_data: Dict,
+                         ranges: Optional[Dict[str, List[Tuple[int, int]]]] = None,
+                         not_executed_ranges: Optional[Dict[str, List[Tuple[int, int]]]] = None):
         """上报覆盖率到MQ
         
+        Args:
+            coverage_data: {filename: {line_number: count, ...}}
+            ranges / not_executed_ranges: _compute_ranges_once 已计算好的已执行/未执行区间，未提供时在格式化时计算
+        
+        注意：此方法捕获所有异常，确保上报失败不会影响被测服务的正常运行
+        """
+        self._report_snapshots([(coverage_data, ranges, not_executed_ranges)])
+    
+    def _report_snapshots(self, snapshots: List[Tuple]):
+        """把一批覆盖率快照分别构建为报告，通过同一个 channel 依次上报
+        
+        Args:
+            snapshots: [(coverage_data, ranges, not_executed_ranges), ...]
+        
         注意：此方法捕获所有异常，确保上报失败不会影响被测服务的正常运行
         """
         if not self.rabbitmq_url:
             logger.warning("[PYCA] RabbitMQ URL not configured, skipping report")
             return
         
+        reports = []
+        for snapshot in snapshots:
+            try:
+                reports.append(self._build_report(*snapshot))
+            except Exception as e:
+                # 捕获所有异常，确保上报失败不会影响被测服务
+                logger.error("[PYCA] Failed to report coverage: %s", e, exc_info=True)
+                # 不重新抛出异常，确保被测服务继续正常运行
+        if not reports:
+            return
+        
+        # 上报到MQ（使用额外的异常保护，确保绝对不会抛出异常）
+        logger.info("[PYCA] About to call _publish_to_mq...")
         try:
-            # 获取Git信息
-            git_info = self._get_git_info()
-            
-            # 如果 repo_id 为空但 repo 不为空，尝试再次获取 repo_id（不阻塞上报）
-            if not git_info.get("repo_id") and git_info.get("repo"):
-                logger.info("[PYCA] Repo ID is empty but repo URL exists, attempting to refresh repo_id...")
-                try:
-                    # 强制刷新 repo_id（不阻塞，使用较短的超时）
-                    git_info_refreshed = self._get_git_info(force_refresh_repo_id=True)
-                    if git_info_refreshed.get("repo_id"):
-                        git_info["repo_id"] = git_info_refreshed["repo_id"]
-                        logger.info(f"[PYCA] Successfully refreshed repo_id: {git_info['repo_id']}")
-                    else:
-                        logger.warning("[PYCA] Failed to refresh repo_id, will report without repo_id")
-                except Exception as e:
-                    logger.warning(f"[PYCA] Error refreshing repo_id: {e}, will report without repo_id")
-            
-            # 生成覆盖率原始数据（类似goc格式）
-            # 添加调试日志：检查coverage_data的内容
-            logger.info(f"[PYCA] Coverage data before formatting: {len(coverage_data)} files")
-            if coverage_data:
-                for filename, line_coverage in list(coverage_data.items())[:3]:  # 只打印前3个文件作为示例
-                    # 检查 line_coverage 的类型
-                    if not isinstance(line_coverage, dict):
-                        logger.error(f"[PYCA] ERROR: line_coverage is not a dict! Type: {type(line_coverage)}, value: {line_coverage}")
-                        continue
-                    
-                    sample_items = list(line_coverage.items())[:5] if line_coverage else []
-                    logger.info(f"[PYCA]   Sample file {filename}: {len(line_coverage)} lines, sample items (first 5): {sample_items}")
-                    # 检查数据类型
-                    if sample_items:
-                        first_key, first_value = sample_items[0]
-                        logger.info(f"[PYCA]     First item - key type: {type(first_key)}, value type: {type(first_value)}, key: {first_key}, value: {first_value}")
-                        
-                        # 如果键不是整数，说明数据结构有问题
-                        if not isinstance(first_key, int):
-                            logger.error(f"[PYCA]     ERROR: Key is not an integer! This indicates coverage_data structure is wrong.")
-                            logger.error(f"[PYCA]     Expected: {{filename: {{line_number: count, ...}}}}")
-                            logger.error(f"[PYCA]     But got: key type {type(first_key)}, which suggests the data structure was corrupted.")
-                            
-                            # 尝试修复：如果 filename 看起来像是被拆分了
-                            if isinstance(filename, str) and len(filename) == 1:
-                                logger.error(f"[PYCA]     WARNING: filename is a single character '{filename}', this suggests the dict was iterated incorrectly!")
-            else:
-                logger.error("[PYCA] ERROR: coverage_data is empty!")
-            
-            coverage_raw = self._format_coverage_raw(coverage_data)
-            
-            # 构建上报消息（参考goc协议）
-            report = {
-                "repo": git_info.get("repo", ""),
-                "repo_id": git_info.get("repo_id", ""),
-                "branch": git_info.get("branch", ""),
-                "commit": git_info.get("commit", ""),
-                "ci": git_info.get("ci", {}),
-                "coverage": {
-                    "format": "pyca",  # Python Coverage Agent
-                    "raw": coverage_raw
-                },
-                "timestamp": int(time.time())
-            }
-            
-            # 打印完整的覆盖率报告详情
-            logger.info("[PYCA] ========== Coverage Report Details ==========")
-            logger.info(f"[PYCA] Repo: {report.get('repo', 'N/A')}")
-            logger.info(f"[PYCA] Repo ID: {report.get('repo_id', 'N/A')}")
-            logger.info(f"[PYCA] Branch: {report.get('branch', 'N/A')}")
-            logger.info(f"[PYCA] Commit: {report.get('commit', 'N/A')}")
-            logger.info(f"[PYCA] CI: {json.dumps(report.get('ci', {}), indent=2)}")
-            logger.info(f"[PYCA] Timestamp: {report.get('timestamp', 'N/A')}")
-            logger.info(f"[PYCA] Coverage Data Files: {len(coverage_data)}")
-            
-            # 打印每个文件的覆盖率详情
-            for filename, line_coverage in coverage_data.items():
-                executed_count = sum(1 for count in line_coverage.values() if count > 0)
-                total_count = len(line_coverage)
-                logger.info(f"[PYCA]   File: {filename}")
-                logger.info(f"[PYCA]     Total lines: {total_count}, Executed lines: {executed_count}, Coverage: {executed_count/total_count*100:.2f}%" if total_count > 0 else f"[PYCA]     Total lines: {total_count}, Executed lines: {executed_count}")
-            
-            # 打印覆盖率原始数据（前1000个字符，避免日志过长）
-            coverage_raw_preview = coverage_raw[:1000] if len(coverage_raw) > 1000 else coverage_raw
-            logger.info(f"[PYCA] Coverage Raw Data (preview, {len(coverage_raw)} chars total):")
-            logger.info(f"[PYCA] {coverage_raw_preview}")
-            if len(coverage_raw) > 1000:
-                logger.info(f"[PYCA] ... (truncated, {len(coverage_raw) - 1000} more chars)")
-            
-            # 打印完整的JSON报告（格式化）
-            report_json = json.dumps(report, indent=2, ensure_ascii=False)
-            logger.info(f"[PYCA] Full Report JSON:")
-            logger.info(f"[PYCA] {report_json}")
-            logger.info("[PYCA] ============================================")
-            
-            # 上报到MQ（使用额外的异常保护，确保绝对不会抛出异常）
-            logger.info("[PYCA] About to call _publish_to_mq...")
+            self._publish_to_mq(reports)
+            logger.info("[PYCA] _publish_to_mq returned successfully")
+        except Exception as publish_error:
+            # 即使 _publish_to_mq 内部有未捕获的异常（理论上不应该发生），也要捕获
+            logger.error("[PYCA] Unexpected error in _publish_to_mq (should not happen): %s", publish_error, exc_info=True)
+            logger.warning("[PYCA] Coverage report failed, but continuing service execution (non-blocking)")
+    
+    def _build_report(self, coverage_data: Dict,
+                      ranges: Optional[Dict[str, List[Tuple[int, int]]]] = None,
+                      not_executed_ranges: Optional[Dict[str, List[Tuple[int, int]]]] = None) -> Dict:
+        """根据一份覆盖率快照构建上报消息（参考goc协议）"""
+        # 获取Git信息
+        git_info = self._get_git_info()
+        
+        # 如果 repo_id 为空但 repo 不为空，尝试再次获取 repo_id（不阻塞上报）
+        if not git_info.get("repo_id") and git_info.get("repo"):
+            logger.info("[PYCA] Repo ID is empty but repo URL exists, attempting to refresh repo_id...")
             try:
-                self._publish_to_mq(report)
-                logger.info("[PYCA] _publish_to_mq returned successfully")
-            except Exception as publish_error:
-                # 即使 _publish_to_mq 内部有未捕获的异常（理论上不应该发生），也要捕获
-                logger.error(f"[PYCA] Unexpected error in _publish_to_mq (should not happen): {publish_error}", exc_info=True)
-                logger.warning("[PYCA] Coverage report failed, but continuing service execution (non-blocking)")
-            
-        except Exception as e:
-            # 捕获所有异常，确保上报失败不会影响被测服务
-            logger.error(f"[PYCA] Failed to report coverage: {e}", exc_info=True)
-            # 不重新抛出异常，确保被测服务继续正常运行
+                # 强制刷新 repo_id（不阻塞，使用较短的超时）
+                git_info_refreshed = self._get_git_info(force_refresh_repo_id=True)
+                if git_info_refreshed.get("repo_id"):
+                    git_info["repo_id"] = git_info_refreshed["repo_id"]
+                    logger.info("[PYCA] Successfully refreshed repo_id: %s", git_info['repo_id'])
+                else:
+                    logger.warning("[PYCA] Failed to refresh repo_id, will report without repo_id")
+            except Exception as e:
+                logger.warning("[PYCA] Error refreshing repo_id: %s, will report without repo_id", e)
+        
+        # 生成覆盖率原始数据（类似goc格式）
+        logger.info("[PYCA] Coverage data before formatting: %d files", len(coverage_data))
+        if not coverage_data:
+            logger.error("[PYCA] ERROR: coverage_data is empty!")
+        
+        coverage_raw = self._format_coverage_raw(coverage_data, ranges, not_executed_ranges)
+        
+        # 构建上报消息（参考goc协议）
+        report = {
+            "repo": git_info.get("repo", ""),
+            "repo_id": git_info.get("repo_id", ""),
+            "branch": git_info.get("branch", ""),
+            "commit": git_info.get("commit", ""),
+            "ci": git_info.get("ci", {}),
+            "coverage": {
+                "format": "pyca",  # Python Coverage Agent
+                "raw": coverage_raw
+            },
+            "timestamp": int(time.time())
+        }
+        
+        # 打印覆盖率报告摘要
+        logger.info("[PYCA] ========== Coverage Report Details ==========")
+        logger.info("[PYCA] Repo: %s", report['repo'] or 'N/A')
+        logger.info("[PYCA] Repo ID: %s", report['repo_id'] or 'N/A')
+        logger.info("[PYCA] Branch: %s", report['branch'] or 'N/A')
+        logger.info("[PYCA] Commit: %s", report['commit'] or 'N/A')
+        logger.info("[PYCA] CI: %s", report['ci'])
+        logger.info("[PYCA] Timestamp: %s", report['timestamp'])
+        logger.info("[PYCA] Coverage Data Files: %d, raw data: %d chars", len(coverage_data), len(coverage_raw))
+        
+        # 原始数据预览和完整报告体积与项目规模成正比，仅在 DEBUG 级别输出
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PYCA] Coverage Raw Data (preview, first 1000 chars):\n%s", coverage_raw[:1000])
+            logger.debug("[PYCA] Full Report JSON:\n%s", json.dumps(report, indent=2, ensure_ascii=False))
+        logger.info("[PYCA] ============================================")
+        
+        return report
     
-    def _format_coverage_raw(self, coverage_data: Dict) -> str:
+    def _format_coverage_raw(self, coverage_data: Dict,
+                             executed_ranges: Optional[Dict[str, List[Tuple[int, int]]]] = None,
+                             not_executed_ranges: Optional[Dict[str, List[Tuple[int, int]]]] = None) -> str:
         """
         格式化覆盖率数据为原始字符串（类似goc格式）
         
@@ -1096,222 +1551,54 @@ class CoverageAgent:
         
         Args:
             coverage_data: {filename: {line_number: count, ...}}
+            executed_ranges / not_executed_ranges: _compute_ranges_once 已计算好的已执行/未执行区间，
+                提供时直接复用，否则在这里计算
         """
+        if executed_ranges is None or not_executed_ranges is None:
+            executed_ranges, not_executed_ranges = self._compute_ranges_once(coverage_data)
+        
         lines = ["mode: count"]
         
         total_files_processed = 0
         total_lines_processed = 0
-        total_lines_skipped = 0
         
-        logger.info(f"[PYCA] Formatting coverage raw data for {len(coverage_data)} files")
+        logger.info("[PYCA] Formatting coverage raw data for %d files", len(coverage_data))
         
         for filename in sorted(coverage_data.keys()):
             line_coverage = coverage_data[filename]
-            
-            # 验证 line_coverage 的类型和结构
-            if not isinstance(line_coverage, dict):
-                logger.error(f"[PYCA] ERROR: line_coverage for {filename} is not a dict! Type: {type(line_coverage)}, value: {line_coverage}")
-                continue
-            
             if not line_coverage:
-                logger.debug(f"[PYCA] Skipping empty file: {filename}")
+                logger.debug("[PYCA] Skipping empty file: %s", filename)
                 continue
+            total_lines_processed += len(line_coverage)
+            total_files_processed += 1
             
-            # 检查数据结构是否正确
-            sample_items = list(line_coverage.items())[:5]
-            if sample_items:
-                first_key, first_value = sample_items[0]
-                # 如果键不是整数，说明数据结构有问题
-                if not isinstance(first_key, int):
-                    logger.error(f"[PYCA] ERROR: Invalid data structure for {filename}!")
-                    logger.error(f"[PYCA]   Expected: {{line_number (int): count (int), ...}}")
-                    logger.error(f"[PYCA]   But got: key type {type(first_key)}, key value: {first_key}")
-                    logger.error(f"[PYCA]   Sample items: {sample_items[:10]}")
-                    
-                    # 如果键是单个字符，说明文件名被错误地拆分了
-                    if isinstance(first_key, str) and len(first_key) == 1:
-                        logger.error(f"[PYCA]   WARNING: Keys are single characters, suggesting filename was incorrectly iterated!")
-                        logger.error(f"[PYCA]   This is a critical bug - coverage_data structure is corrupted!")
-                        # 跳过这个文件，因为数据无法修复
-                        continue
+            # 格式: file.py:start_line.end_col,end_line.end_col statements count
+            # 文件名前缀在每个文件内只拼接一次，区间行批量追加
+            prefix = f"{filename}:"
             
-            # 将所有行按count分组：已执行（count>0）和未执行（count=0）
-            # 确保行号是整数类型，过滤掉非数字的键
-            executed_lines = []
-            not_executed_lines = []
-            file_lines_skipped = 0
+            # 已执行的区间，count = 1 表示已覆盖
+            file_executed_ranges = executed_ranges.get(filename)
+            if file_executed_ranges:
+                lines.extend(f"{prefix}{start}.0,{end}.0 {end - start + 1} 1" for start, end in file_executed_ranges)
             
-            # 添加调试：打印前几个item的示例
-            logger.info(f"[PYCA] Processing {filename}: {len(line_coverage)} lines, sample items: {sample_items}")
-            
-            for line, count in line_coverage.items():
-                try:
-                    # 处理行号：可能是整数或字符串
-                    if isinstance(line, int):
-                        line_num = line
-                    elif isinstance(line, str):
-                        line_num = int(line)
-                    else:
-                        logger.warning(f"[PYCA] Unexpected line type: {type(line)} for line {line} in file {filename}")
-                        file_lines_skipped += 1
-                        total_lines_skipped += 1
-                        continue
-                    
-                    # 处理count：确保是数字类型
-                    if isinstance(count, (int, float)):
-                        count_value = int(count)
-                    elif isinstance(count, str):
-                        try:
-                            count_value = int(count)
-                        except ValueError:
-                            logger.warning(f"[PYCA] Invalid count value: {count} (type: {type(count)}) for line {line_num} in file {filename}")
-                            file_lines_skipped += 1
-                            total_lines_skipped += 1
-                            continue
-                    else:
-                        logger.warning(f"[PYCA] Unexpected count type: {type(count)} for line {line_num} in file {filename}")
-                        file_lines_skipped += 1
-                        total_lines_skipped += 1
-                        continue
-                    
-                    total_lines_processed += 1
-                    if count_value > 0:
-                        executed_lines.append(line_num)
-                    else:
-                        not_executed_lines.append(line_num)
-                        
-                except (ValueError, TypeError) as e:
-                    # 跳过非数字的键（可能是数据格式问题）
-                    logger.warning(f"[PYCA] Skipping invalid line number: {line} (type: {type(line)}, error: {e}) in file {filename}")
-                    file_lines_skipped += 1
-                    total_lines_skipped += 1
-                    continue
-            
-            if file_lines_skipped > 0:
-                logger.warning(f"[PYCA] Skipped {file_lines_skipped} lines in file {filename} due to format issues")
-            
-            executed_lines = sorted(executed_lines)
-            not_executed_lines = sorted(not_executed_lines)
-            
-            logger.info(f"[PYCA] Formatting {filename}: {len(executed_lines)} executed, {len(not_executed_lines)} not executed, {file_lines_skipped} skipped in this file")
-            
-            # 如果处理后的行数为0，说明所有行都被跳过了，记录警告并尝试强制处理
-            if len(executed_lines) == 0 and len(not_executed_lines) == 0 and len(line_coverage) > 0:
-                logger.error(f"[PYCA] ERROR: All {len(line_coverage)} lines in {filename} were skipped! This should not happen.")
-                logger.error(f"[PYCA]   Sample items from line_coverage: {list(line_coverage.items())[:5]}")
-                # 尝试直接处理，不进行类型转换
-                for line, count in list(line_coverage.items())[:5]:
-                    logger.error(f"[PYCA]     Raw item - line: {line} (type: {type(line)}), count: {count} (type: {type(count)})")
-                
-                # 强制处理：直接使用原始数据，假设所有行都未执行
-                logger.warning(f"[PYCA] Attempting fallback: treating all lines as not executed")
-                fallback_lines = []
-                for line, count in line_coverage.items():
-                    try:
-                        if isinstance(line, int):
-                            line_num = line
-                        else:
-                            line_num = int(str(line))
-                        fallback_lines.append(line_num)
-                    except:
-                        continue
-                
-                if fallback_lines:
-                    not_executed_lines = sorted(fallback_lines)
-                    logger.info(f"[PYCA] Fallback: Using {len(not_executed_lines)} lines as not executed")
-            
-            # 处理已执行的行（压缩为区间）
-            if executed_lines:
-                executed_ranges = self._compress_lines_to_ranges(executed_lines)
-                logger.info(f"[PYCA]   Executed ranges for {filename}: {executed_ranges}")
-                for start, end in executed_ranges:
-                    statements = end - start + 1
-                    count = 1  # 已覆盖
-                    # 格式: file.py:start_line.end_col,end_line.end_col statements count
-                    coverage_line = f"{filename}:{start}.0,{end}.0 {statements} {count}"
-                    lines.append(coverage_line)
-                    logger.debug(f"[PYCA]   Added executed line: {coverage_line}")
-            
-            # 处理未执行的行（压缩为区间）
+            # 未执行的区间，count = 0 表示未覆盖
             # 注意：即使所有行都未执行，也要生成覆盖率数据（count=0）
-            if not_executed_lines:
-                not_executed_ranges = self._compress_lines_to_ranges(not_executed_lines)
-                logger.info(f"[PYCA]   Not executed ranges for {filename}: {len(not_executed_ranges)} ranges, first few: {not_executed_ranges[:3]}")
-                for start, end in not_executed_ranges:
-                    statements = end - start + 1
-                    count = 0  # 未覆盖
-                    # 格式: file.py:start_line.end_col,end_line.end_col statements count
-                    coverage_line = f"{filename}:{start}.0,{end}.0 {statements} {count}"
-                    lines.append(coverage_line)
-                    logger.debug(f"[PYCA]   Added not executed line: {coverage_line}")
-                total_files_processed += 1
-                logger.info(f"[PYCA]   Successfully processed {filename}: added {len(not_executed_ranges)} coverage lines for not executed lines")
-            elif executed_lines:
-                # 如果有执行的行，也要计数
-                total_files_processed += 1
-                logger.info(f"[PYCA]   Successfully processed {filename}: added {len(executed_ranges)} coverage lines for executed lines")
-            else:
-                # 如果既没有执行的行，也没有未执行的行，说明所有行都被跳过了
-                # 这不应该发生，但为了安全，我们记录警告
-                logger.error(f"[PYCA]   ERROR: No coverage lines generated for {filename}!")
-                logger.error(f"[PYCA]     Executed lines: {len(executed_lines)}, Not executed lines: {len(not_executed_lines)}")
-                logger.error(f"[PYCA]     Original line_coverage size: {len(line_coverage)}")
-                logger.error(f"[PYCA]     Lines skipped: {file_lines_skipped}")
-                # 如果原始数据不为空，但处理后为空，说明数据格式有问题
-                if len(line_coverage) > 0:
-                    logger.error(f"[PYCA]     This indicates a data format issue - all lines were skipped during processing")
-        
-        logger.info(f"[PYCA] Formatted coverage raw: {total_files_processed} files processed, {total_lines_processed} lines processed, {total_lines_skipped} lines skipped, {len(lines)-1} coverage lines generated")
+            file_not_executed_ranges = not_executed_ranges.get(filename)
+            if file_not_executed_ranges:
+                lines.extend(f"{prefix}{start}.0,{end}.0 {end - start + 1} 0" for start, end in file_not_executed_ranges)
+        
+        logger.info("[PYCA] Formatted coverage raw: %d files processed, %d lines processed, %d coverage lines generated",
+                    total_files_processed, total_lines_processed, len(lines) - 1)
         
         result = "\n".join(lines)
-        logger.info(f"[PYCA] Coverage raw result length: {len(result)} chars, {len(lines)} lines (including header)")
+        logger.info("[PYCA] Coverage raw result length: %d chars, %d lines (including header)", len(result), len(lines))
         
-        if len(result) <= len("mode: count") or len(lines) <= 1:
-            logger.error(f"[PYCA] ERROR: Coverage raw data is empty or only contains header!")
-            logger.error(f"[PYCA]   Files in coverage_data: {len(coverage_data)}")
-            logger.error(f"[PYCA]   Total lines processed: {total_lines_processed}")
-            logger.error(f"[PYCA]   Total lines skipped: {total_lines_skipped}")
-            logger.error(f"[PYCA]   Coverage lines generated: {len(lines)-1}")
-            logger.error(f"[PYCA]   Result: {result[:200]}")  # 打印前200个字符
+        if len(lines) <= 1:
+            logger.error("[PYCA] ERROR: Coverage raw data is empty or only contains header! Files in coverage_data: %d",
+                         len(coverage_data))
         
         return result
     
-    def _compress_lines_to_ranges(self, lines: List[int]) -> List[Tuple[int, int]]:
-        """
-        将行号列表压缩为区间列表
-        
-        Args:
-            lines: 排序后的行号列表
-        
-        Returns:
-            [(start_line, end_line), ...]
-        """
-        if not lines:
-            return []
-        
-        # 确保所有元素都是整数
-        lines = [int(line) for line in lines]
-        lines = sorted(lines)  # 确保排序
-        
-        ranges = []
-        start = int(lines[0])
-        end = int(lines[0])
-        
-        for line in lines[1:]:
-            line = int(line)
-            if line == end + 1:
-                # 连续，扩展区间
-                end = line
-            else:
-                # 不连续，保存当前区间，开始新区间
-                ranges.append((start, end))
-                start = line
-                end = line
-        
-        # 保存最后一个区间
-        ranges.append((start, end))
-        return ranges
-    
     def _get_git_info(self, force_refresh_repo_id: bool = False) -> Dict:
         """
         获取Git信息
@@ -1336,8 +1623,6 @@ class CoverageAgent:
             }
             
             try:
-                import subprocess
-                
                 # 获取当前工作目录
                 cwd = os.getcwd()
                 
@@ -1350,50 +1635,27 @@ class CoverageAgent:
                 
                 repo_root = os.path.dirname(git_dir)
                 
+                # 直接读取 .git 下的 HEAD、refs 和 config 文件，不启动 git 子进程；
+                # 读取不到的字段再回退到 git 命令
+                git_info.update(self._read_git_metadata(git_dir))
+                
                 # 获取remote origin URL
-                try:
-                    result = subprocess.run(
-                        ['git', 'config', '--get', 'remote.origin.url'],
-                        cwd=repo_root,
-                        capture_output=True,
-                        text=True,
-                        timeout=5
-                    )
-                    if result.returncode == 0:
-                        git_info["repo"] = result.stdout.strip()
+                if git_info["repo"]:
+                    logger.info(f"[PYCA] Retrieved git repo URL: {git_info['repo']}")
+                else:
+                    git_info["repo"] = self._run_git(repo_root, 'config', '--get', 'remote.origin.url')
+                    if git_info["repo"]:
                         logger.info(f"[PYCA] Retrieved git repo URL: {git_info['repo']}")
                     else:
-                        logger.warning(f"[PYCA] Failed to get git remote URL: returncode={result.returncode}, stderr={result.stderr.strip()}")
-                except Exception as e:
-                    logger.warning(f"[PYCA] Failed to get git remote: {e}")
+                        logger.warning("[PYCA] Failed to get git remote URL")
                 
                 # 获取branch
-                try:
-                    result = subprocess.run(
-                        ['git', 'rev-parse', '--abbrev-ref', 'HEAD'],
-                        cwd=repo_root,
-                        capture_output=True,
-                        text=True,
-                        timeout=5
-                    )
-                    if result.returncode == 0:
-                        git_info["branch"] = result.stdout.strip()
-                except Exception as e:
-                    logger.debug(f"[PYCA] Failed to get git branch: {e}")
+                if not git_info["branch"]:
+                    git_info["branch"] = self._run_git(repo_root, 'rev-parse', '--abbrev-ref', 'HEAD')
                 
                 # 获取commit
-                try:
-                    result = subprocess.run(
-                        ['git', 'rev-parse', 'HEAD'],
-                        cwd=repo_root,
-                        capture_output=True,
-                        text=True,
-                        timeout=5
-                    )
-                    if result.returncode == 0:
-                        git_info["commit"] = result.stdout.strip()
-                except Exception as e:
-                    logger.debug(f"[PYCA] Failed to get git commit: {e}")
+                if not git_info["commit"]:
+                    git_info["commit"] = self._run_git(repo_root, 'rev-parse', 'HEAD')
                 
                 # 获取CI信息
                 git_info["ci"] = self._get_ci_info()
@@ -1419,15 +1681,117 @@ class CoverageAgent:
         self._git_info = git_info
         return git_info
     
-    def _find_git_dir(self, start_dir: str) -> Optional[str]:
-        """查找.git目录"""
-        dir_path = Path(start_dir)
-        while dir_path != dir_path.parent:
-            git_path = dir_path / ".git"
-            if git_path.exists():
-                return str(git_path)
-            dir_path = dir_path.parent
-        return None
+    def _read_git_metadata(self, git_dir: str) -> Dict[str, str]:
+        """
+        直接从 .git 目录读取 remote origin URL、branch 和 commit
+        
+        支持 worktree / submodule（.git 为文件，内容为 "gitdir: <path>"）以及 packed-refs。
+        
+        Args:
+            git_dir: _find_git_dir 返回的 .git 路径（目录或文件）
+        
+        Returns:
+            {"repo": ..., "branch": ..., "commit": ...}，读取失败的字段为空字符串
+        """
+        metadata = {"repo": "", "branch": "", "commit": ""}
+        try:
+            # worktree / submodule 的 .git 是文件，指向真正的 git 目录
+            if os.path.isfile(git_dir):
+                with open(git_dir, 'r', encoding='utf-8') as f:
+                    content = f.read().strip()
+                if not content.startswith('gitdir:'):
+                    return metadata
+                git_dir = os.path.join(os.path.dirname(git_dir), content[len('gitdir:'):].strip())
+            
+            # worktree 的 refs 和 config 位于 commondir 指向的主仓库 git 目录
+            common_dir = git_dir
+            commondir_file = os.path.join(git_dir, 'commondir')
+            if os.path.isfile(commondir_file):
+                with open(commondir_file, 'r', encoding='utf-8') as f:
+                    common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+            
+            # HEAD: "ref: refs/heads/<branch>" 或分离状态下的 commit SHA
+            with open(os.path.join(git_dir, 'HEAD'), 'r', encoding='utf-8') as f:
+                head = f.read().strip()
+            if head.startswith('ref:'):
+                ref = head[len('ref:'):].strip()
+                metadata["branch"] = ref[len('refs/heads/'):] if ref.startswith('refs/heads/') else ref
+                metadata["commit"] = self._resolve_git_ref(git_dir, common_dir, ref)
+            else:
+                # 与 git rev-parse --abbrev-ref HEAD 一致，分离状态下 branch 为 "HEAD"
+                metadata["branch"] = "HEAD"
+                metadata["commit"] = head
+            
+            metadata["repo"] = self._read_git_remote_url(common_dir)
+        except Exception as e:
+            logger.debug(f"[PYCA] Failed to read git metadata from {git_dir}: {e}")
+        return metadata
+    
+    @staticmethod
+    def _resolve_git_ref(git_dir: str, common_dir: str, ref: str) -> str:
+        """读取 ref 对应的 commit SHA（先查松散 ref 文件，再查 packed-refs），找不到时返回空字符串"""
+        for base in (git_dir, common_dir):
+            ref_file = os.path.join(base, *ref.split('/'))
+            if os.path.isfile(ref_file):
+                with open(ref_file, 'r', encoding='utf-8') as f:
+                    return f.read().strip()
+        
+        packed_refs = os.path.join(common_dir, 'packed-refs')
+        if os.path.isfile(packed_refs):
+            with open(packed_refs, 'r', encoding='utf-8') as f:
+                for line in f:
+                    # 跳过注释行和 peeled 行（"^<sha>"）
+                    if line.startswith(('#', '^')):
+                        continue
+                    parts = line.split()
+                    if len(parts) == 2 and parts[1] == ref:
+                        return parts[0]
+        return ""
+    
+    @staticmethod
+    def _read_git_remote_url(common_dir: str) -> str:
+        """从 git config 读取 remote.origin.url，找不到时返回空字符串"""
+        config_file = os.path.join(common_dir, 'config')
+        if not os.path.isfile(config_file):
+            return ""
+        with open(config_file, 'r', encoding='utf-8') as f:
+            # git config 的键带有缩进，configparser 会把缩进行当作续行，先去掉行首空白
+            content = "\n".join(line.strip() for line in f)
+        parser = configparser.ConfigParser(strict=False, interpolation=None)
+        parser.read_string(content)
+        return parser.get('remote "origin"', 'url', fallback="").strip()
+    
+    @staticmethod
+    def _run_git(repo_root: str, *args: str) -> str:
+        """执行 git 命令并返回输出，失败时返回空字符串"""
+        try:
+            import subprocess
+            result = subprocess.run(
+                ['git', *args],
+                cwd=repo_root,
+                capture_output=True,
+                text=True,
+                timeout=5
+            )
+            if result.returncode == 0:
+                return result.stdout.strip()
+            logger.debug(f"[PYCA] git {' '.join(args)} failed: returncode={result.returncode}, stderr={result.stderr.strip()}")
+        except Exception as e:
+            logger.debug(f"[PYCA] git {' '.join(args)} failed: {e}")
+        return ""
+    
+    @staticmethod
+    def _find_git_dir(start_dir: str) -> Optional[str]:
+        """查找.git目录（worktree / submodule 中 .git 为文件，同样返回）"""
+        dir_path = os.path.abspath(start_dir)
+        while True:
+            git_path = os.path.join(dir_path, ".git")
+            if os.path.isdir(git_path) or os.path.isfile(git_path):
+                return git_path
+            parent = os.path.dirname(dir_path)
+            if parent == dir_path:
+                return None
+            dir_path = parent
     
     def _get_ci_info(self) -> Dict:
         """获取CI信息"""
@@ -1473,8 +1837,12 @@ class CoverageAgent:
         try:
             self._repo_id_cache[repo_url] = repo_id
             self.repo_id_cache_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.repo_id_cache_file, 'w') as f:
-                json.dump(self._repo_id_cache, f, indent=2)
+            # 缓存文件只由 agent 读写，使用紧凑 JSON；先写临时文件再原子替换，
+            # 避免多个进程同时写入或中途退出时留下不完整的文件
+            tmp_file = self.repo_id_cache_file.with_name(f"{self.repo_id_cache_file.name}.{os.getpid()}.tmp")
+            with open(tmp_file, 'wb') as f:
+                f.write(_dumps_json_bytes(self._repo_id_cache))
+            os.replace(tmp_file, self.repo_id_cache_file)
             logger.debug(f"[PYCA] Cached repo_id for {repo_url}: {repo_id}")
         except Exception as e:
             logger.warning(f"[PYCA] Failed to save repo_id cache: {e}")
@@ -1488,237 +1856,465 @@ class CoverageAgent:
         # 先检查缓存
         if repo_url in self._repo_id_cache:
             cached_repo_id = self._repo_id_cache[repo_url]
-            logger.info(f"[PYCA] Using cached repo_id for {repo_url}: {cached_repo_id}")
+            logger.info("[PYCA] Using cached repo_id for %s: %s", repo_url, cached_repo_id)
             return cached_repo_id
         
         # 缓存未命中，调用 API
         try:
-            import re
-            import urllib.request
-            
-            logger.info(f"[PYCA] Attempting to get GitHub repo ID for: {repo_url}")
-            
-            # 解析repo URL
-            # 支持格式: https://github.com/owner/repo, git@github.com:owner/repo
-            patterns = [
-                re.compile(r'(?i)^https?://github\.com/([^/]+)/([^/]+)/?$'),
-                re.compile(r'(?i)^git@github\.com:([^/]+)/([^/]+)/?$'),
-                re.compile(r'(?i)^git://github\.com/([^/]+)/([^/]+)/?$')
-            ]
+            logger.info("[PYCA] Attempting to get GitHub repo ID for: %s", repo_url)
             
             original_repo_url = repo_url
             repo_url_clean = repo_url.rstrip('.git').rstrip('/')
             owner, repo = None, None
             
-            logger.debug(f"[PYCA] Parsing repo URL: original='{original_repo_url}', cleaned='{repo_url_clean}'")
+            logger.debug("[PYCA] Parsing repo URL: original='%s', cleaned='%s'", original_repo_url, repo_url_clean)
             
-            for i, pattern in enumerate(patterns):
+            # 解析repo URL
+            for i, pattern in enumerate(_GITHUB_URL_PATTERNS):
                 match = pattern.match(repo_url_clean)
                 if match:
                     owner, repo = match.groups()
-                    logger.info(f"[PYCA] Matched pattern {i+1}: owner={owner}, repo={repo}")
+                    logger.info("[PYCA] Matched pattern %d: owner=%s, repo=%s", i + 1, owner, repo)
                     break
             
             if not owner or not repo:
-                logger.warning(f"[PYCA] Failed to parse repo URL: {original_repo_url}")
-                logger.warning(f"[PYCA]   After cleaning: {repo_url_clean}")
-                logger.warning(f"[PYCA]   Tried patterns: https://github.com/owner/repo, git@github.com:owner/repo, git://github.com/owner/repo")
+                logger.warning("[PYCA] Failed to parse repo URL: %s", original_repo_url)
+                logger.warning("[PYCA]   After cleaning: %s", repo_url_clean)
+                logger.warning("[PYCA]   Tried patterns: https://github.com/owner/repo, git@github.com:owner/repo, git://github.com/owner/repo")
                 # 尝试手动解析常见格式
                 if 'github.com' in repo_url_clean:
                     parts = repo_url_clean.split('github.com')[-1].strip('/').split('/')
                     if len(parts) >= 2:
                         owner, repo = parts[0], parts[1]
-                        logger.info(f"[PYCA] Manually parsed: owner={owner}, repo={repo}")
+                        logger.info("[PYCA] Manually parsed: owner=%s, repo=%s", owner, repo)
                     else:
-                        logger.warning(f"[PYCA] Could not extract owner/repo from URL parts: {parts}")
+                        logger.warning("[PYCA] Could not extract owner/repo from URL parts: %s", parts)
                         return None
                 else:
                     return None
             
             # 调用GitHub API
-            api_url = f"https://api.github.com/repos/{owner}/{repo}"
-            logger.info(f"[PYCA] Calling GitHub API: {api_url}")
-            req = urllib.request.Request(api_url)
-            req.add_header('User-Agent', 'pyca-agent')
+            api_path = f"/repos/{owner}/{repo}"
+            api_url = f"https://{GITHUB_API_HOST}{api_path}"
+            logger.info("[PYCA] Calling GitHub API: %s", api_url)
+            headers = {'User-Agent': 'pyca-agent', 'Accept': 'application/vnd.github+json'}
             
             # 支持 GitHub token 认证（从环境变量获取，支持PYCA_*和PCA_*向后兼容）
             github_token = os.getenv('GITHUB_TOKEN') or os.getenv('PYCA_GITHUB_TOKEN') or os.getenv('PCA_GITHUB_TOKEN')
             if github_token:
-                req.add_header('Authorization', f'token {github_token}')
+                headers['Authorization'] = f'token {github_token}'
                 logger.debug("[PYCA] Using GitHub token for authentication (higher rate limit)")
             else:
                 logger.debug("[PYCA] No GitHub token found, using unauthenticated request (lower rate limit)")
             
-            try:
-                with urllib.request.urlopen(req, timeout=10) as response:
-                    if response.status == 200:
-                        data = json.loads(response.read().decode('utf-8'))
-                        repo_id = str(data.get('id', ''))
-                        if repo_id:
-                            logger.info(f"[PYCA] Successfully retrieved repo_id: {repo_id} for {owner}/{repo}")
-                            # 保存到缓存
-                            self._save_repo_id_cache(repo_url, repo_id)
-                            return repo_id
-                        else:
-                            logger.warning(f"[PYCA] GitHub API response does not contain 'id' field. Response keys: {list(data.keys())[:10]}")
-                    else:
-                        logger.warning(f"[PYCA] GitHub API returned status {response.status} for {api_url}")
-                        # 尝试读取响应体以获取更多信息
-                        try:
-                            response_body = response.read().decode('utf-8')
-                            logger.debug(f"[PYCA] Response body: {response_body[:200]}")
-                        except:
-                            pass
-            except urllib.error.HTTPError as e:
-                error_body = ""
+            # 触发限流（403/429）时按退避时间重试，最多 GITHUB_MAX_ATTEMPTS 次
+            for attempt in range(GITHUB_MAX_ATTEMPTS):
                 try:
-                    if hasattr(e, 'read'):
-                        error_body = e.read().decode('utf-8')
-                except:
-                    pass
-                
-                logger.warning(f"[PYCA] HTTP error getting GitHub repo ID: {e.code} - {e.reason}")
-                
-                if e.code == 404:
-                    logger.warning(f"[PYCA] Repository not found on GitHub: {owner}/{repo}")
-                    logger.warning(f"[PYCA]   Please check if the repo URL is correct: {original_repo_url}")
-                elif e.code == 403:
-                    if 'rate limit' in error_body.lower():
-                        logger.warning(f"[PYCA] GitHub API rate limit exceeded for unauthenticated requests")
-                        logger.warning(f"[PYCA]   To increase rate limit, set GITHUB_TOKEN or PYCA_GITHUB_TOKEN environment variable")
-                        logger.warning(f"[PYCA]   Example: export GITHUB_TOKEN=your_github_token")
-                        logger.warning(f"[PYCA]   See: https://docs.github.com/en/authentication/keeping-your-account-and-data-secure/creating-a-personal-access-token")
-                    else:
-                        logger.warning(f"[PYCA] GitHub API access denied (403). Response: {error_body[:200]}")
-                elif e.code == 401:
-                    logger.warning(f"[PYCA] GitHub API authentication failed (401)")
-                    logger.warning(f"[PYCA]   Please check if GITHUB_TOKEN or PYCA_GITHUB_TOKEN is valid")
+                    status, reason, response_headers, body = self._github_get(api_path, headers)
+                except (OSError, http.client.HTTPException) as e:
+                    logger.warning("[PYCA] URL error getting GitHub repo ID: %s", e)
+                    logger.warning("[PYCA]   This might be a network issue or GitHub API is unreachable")
+                    return None
+                if attempt + 1 == GITHUB_MAX_ATTEMPTS or not self._is_github_rate_limited(status, response_headers, body):
+                    break
+                delay = self._github_retry_delay(response_headers, attempt)
+                if delay is None:
+                    logger.warning("[PYCA] GitHub API rate limit resets too far in the future, not retrying now")
+                    break
+                logger.info("[PYCA] GitHub API rate limited (%d), retrying in %.1fs (attempt %d/%d)",
+                            status, delay, attempt + 1, GITHUB_MAX_ATTEMPTS)
+                time.sleep(delay)
+            
+            if status == 200:
+                data = json.loads(body.decode('utf-8'))
+                repo_id = str(data.get('id', ''))
+                if repo_id:
+                    logger.info("[PYCA] Successfully retrieved repo_id: %s for %s/%s", repo_id, owner, repo)
+                    # 保存到缓存
+                    self._save_repo_id_cache(repo_url, repo_id)
+                    return repo_id
+                else:
+                    logger.warning("[PYCA] GitHub API response does not contain 'id' field. Response keys: %s", list(data.keys())[:10])
+                return None
+            
+            logger.warning("[PYCA] HTTP error getting GitHub repo ID: %d - %s", status, reason)
+            
+            if status == 404:
+                logger.warning("[PYCA] Repository not found on GitHub: %s/%s", owner, repo)
+                logger.warning("[PYCA]   Please check if the repo URL is correct: %s", original_repo_url)
+            elif status in (403, 429):
+                if self._is_github_rate_limited(status, response_headers, body):
+                    logger.warning("[PYCA] GitHub API rate limit exceeded for unauthenticated requests")
+                    logger.warning("[PYCA]   To increase rate limit, set GITHUB_TOKEN or PYCA_GITHUB_TOKEN environment variable")
+                    logger.warning("[PYCA]   Example: export GITHUB_TOKEN=your_github_token")
+                    logger.warning("[PYCA]   See: https://docs.github.com/en/authentication/keeping-your-account-and-data-secure/creating-a-personal-access-token")
                 else:
-                    logger.warning(f"[PYCA] Unexpected HTTP error: {e.code}")
-                    if error_body:
-                        logger.debug(f"[PYCA] Error response: {error_body[:200]}")
-            except urllib.error.URLError as e:
-                logger.warning(f"[PYCA] URL error getting GitHub repo ID: {e.reason}")
-                logger.warning(f"[PYCA]   This might be a network issue or GitHub API is unreachable")
+                    logger.warning("[PYCA] GitHub API access denied (403). Response: %s",
+                                   body[:200].decode('utf-8', errors='replace'))
+            elif status == 401:
+                logger.warning("[PYCA] GitHub API authentication failed (401)")
+                logger.warning("[PYCA]   Please check if GITHUB_TOKEN or PYCA_GITHUB_TOKEN is valid")
+            else:
+                logger.warning("[PYCA] Unexpected HTTP error: %d", status)
+                if body and logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("[PYCA] Error response: %s", body[:200].decode('utf-8', errors='replace'))
         
         except Exception as e:
-            logger.error(f"[PYCA] Failed to get GitHub repo ID: {e}", exc_info=True)
+            logger.error("[PYCA] Failed to get GitHub repo ID: %s", e, exc_info=True)
         
         return None
     
-    def _publish_to_mq(self, report: Dict):
-        """发布消息到RabbitMQ
-        
-        注意：此方法捕获所有异常并记录日志，不会抛出异常，确保上报失败不会影响被测服务
+    @staticmethod
+    def _is_github_rate_limited(status: int, headers, body: bytes) -> bool:
+        """判断 GitHub API 响应是否为限流（429，或带限流标记的 403）"""
+        if status == 429:
+            return True
+        if status != 403:
+            return False
+        return (headers.get('Retry-After') is not None
+                or headers.get('X-RateLimit-Remaining') == '0'
+                or b'rate limit' in body.lower())
+    
+    @staticmethod
+    def _github_retry_delay(headers, attempt: int) -> Optional[float]:
         """
+        计算限流后重试前的等待时间：指数退避（带随机抖动），并遵循 Retry-After / X-RateLimit-Reset
         
-        connection = None
+        Returns:
+            等待秒数；服务端要求的等待时间超过 GITHUB_RETRY_MAX_DELAY 时返回 None（本次不再重试）
+        """
+        required = 0.0
         try:
-            # 解析RabbitMQ URL
-            logger.info(f"[PYCA] RabbitMQ URL: {self.rabbitmq_url}")
-            parsed = urlparse(self.rabbitmq_url)
-            logger.info(f"[PYCA] Parsed RabbitMQ URL: {parsed}")
-            # 提取认证信息
-            username = parsed.username or 'guest'
-            password = parsed.password or 'guest'
-            host = parsed.hostname or 'localhost'
-            port = parsed.port or 5672
-            vhost = parsed.path.lstrip('/') or '/'
-            
-            # 添加调试日志
-            logger.info(f"[PYCA] Connecting to RabbitMQ: host={host}, port={port}, vhost={vhost}, username={username}")
-            
-            # 连接RabbitMQ
-            # 验证hostname不为空，避免回退到localhost
-            if not host or host == 'localhost':
-                error_msg = f"[PYCA] ERROR: Invalid RabbitMQ hostname '{host}' from URL '{self.rabbitmq_url}'. Please check your configuration."
-                logger.error(error_msg)
-                # 不抛出异常，只记录日志
-                return
-            
-            # 验证hostname是否可以解析（避免DNS解析失败导致pika回退到localhost）
+            retry_after = headers.get('Retry-After')
+            rate_limit_reset = headers.get('X-RateLimit-Reset')
+            if retry_after is not None:
+                required = float(retry_after)
+            elif rate_limit_reset is not None and headers.get('X-RateLimit-Remaining') == '0':
+                required = float(rate_limit_reset) - time.time()
+        except ValueError:
+            pass
+        if required > GITHUB_RETRY_MAX_DELAY:
+            return None
+        return max(required, random.uniform(0, 2 ** attempt))
+    
+    def _github_get(self, path: str, headers: Dict[str, str]) -> Tuple[int, str, http.client.HTTPMessage, bytes]:
+        """
+        通过复用的 HTTPS 连接向 GitHub API 发送 GET 请求
+        
+        连接在多次请求之间保持（keep-alive），避免每次都重新进行 TCP 和 TLS 握手；
+        复用的连接已被服务端关闭时重连并重试一次
+        
+        Returns:
+            (status, reason, headers, body)
+        
+        Raises:
+            OSError / http.client.HTTPException: 网络错误
+        """
+        for attempt in (1, 2):
+            if self._github_conn is None:
+                self._github_conn = self._new_github_connection()
             try:
-                import socket
-                resolved = socket.gethostbyname(host)
-                logger.info(f"[PYCA] DNS resolution for '{host}': {resolved}")
-            except socket.gaierror as e:
-                error_msg = f"[PYCA] ERROR: Cannot resolve hostname '{host}' from URL '{self.rabbitmq_url}'. DNS error: {e}"
-                logger.error(error_msg)
-                # 不抛出异常，只记录日志
-                return
+                self._github_conn.request('GET', path, headers=headers)
+                response = self._github_conn.getresponse()
+                body = response.read()
+                if response.will_close:
+                    self._close_github_connection()
+                return response.status, response.reason, response.msg, body
+            except (OSError, http.client.HTTPException):
+                self._close_github_connection()
+                if attempt == 2:
+                    raise
+                logger.debug("[PYCA] GitHub connection is no longer usable, reconnecting")
+    
+    @staticmethod
+    def _new_github_connection() -> http.client.HTTPSConnection:
+        """
+        建立到 GitHub API 的 HTTPS 连接，遵循 HTTPS_PROXY / NO_PROXY 环境变量：
+        需要走代理时连接代理并通过 CONNECT 隧道访问 GitHub（与 urllib 的代理行为一致）
+        """
+        proxy = urllib.request.getproxies().get('https')
+        if not proxy or urllib.request.proxy_bypass(GITHUB_API_HOST):
+            return http.client.HTTPSConnection(GITHUB_API_HOST, timeout=10)
+        
+        parsed = urlparse(proxy if '://' in proxy else f'http://{proxy}')
+        tunnel_headers = {}
+        if parsed.username:
+            credentials = f"{unquote(parsed.username)}:{unquote(parsed.password or '')}"
+            tunnel_headers['Proxy-Authorization'] = 'Basic ' + base64.b64encode(credentials.encode()).decode('ascii')
+        logger.debug("[PYCA] Using HTTPS proxy %s:%s for GitHub API", parsed.hostname, parsed.port or 80)
+        conn = http.client.HTTPSConnection(parsed.hostname, parsed.port or 80, timeout=10)
+        conn.set_tunnel(GITHUB_API_HOST, 443, headers=tunnel_headers)
+        return conn
+    
+    def _close_github_connection(self):
+        """关闭并丢弃复用的 GitHub API 连接"""
+        conn = self._github_conn
+        self._github_conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+    
+    def _build_mq_params(self):
+        """
+        解析 RabbitMQ URL 并构建连接参数（在初始化时调用一次，之后每次建立连接直接复用）
+        
+        Returns:
+            pika.ConnectionParameters，hostname 无效时返回 None（只记录日志，不抛出异常）
+        """
+        # 解析RabbitMQ URL
+        logger.info("[PYCA] RabbitMQ URL: %s", self.rabbitmq_url)
+        parsed = urlparse(self.rabbitmq_url)
+        logger.info("[PYCA] Parsed RabbitMQ URL: %s", parsed)
+        # 提取认证信息
+        username = parsed.username or 'guest'
+        password = parsed.password or 'guest'
+        host = parsed.hostname or 'localhost'
+        port = parsed.port or 5672
+        vhost = parsed.path.lstrip('/') or '/'
+        
+        # 验证hostname不为空，避免回退到localhost
+        if not host or host == 'localhost':
+            error_msg = f"[PYCA] ERROR: Invalid RabbitMQ hostname '{host}' from URL '{self.rabbitmq_url}'. Please check your configuration."
+            logger.error(error_msg)
+            # 不抛出异常，只记录日志
+            return None
+        
+        credentials = pika.PlainCredentials(username, password)
+        parameters = pika.ConnectionParameters(
+            host=host,
+            port=port,
+            virtual_host=vhost,
+            credentials=credentials,
+            socket_timeout=10,  # 设置socket超时
+            connection_attempts=1,  # 只尝试一次，避免自动重试
+            retry_delay=0,  # 不延迟重试
+            heartbeat=MQ_HEARTBEAT_SECONDS,  # 复用的长连接靠心跳保活，由上报线程空闲时处理
+            blocked_connection_timeout=10,  # broker 流控阻塞连接时不无限等待
+        )
+        
+        logger.info("[PYCA] Pika connection parameters: host=%s, port=%s, vhost=%s, username=%s",
+                    parameters.host, parameters.port, parameters.virtual_host, username)
+        self._mq_host = host
+        return parameters
+    
+    def _resolve_host(self, host: str) -> Optional[str]:
+        """
+        解析主机名为IP地址，结果按 DNS_CACHE_TTL_SECONDS 缓存，解析失败按 DNS_NEGATIVE_CACHE_TTL_SECONDS 缓存
+        
+        Args:
+            host: 主机名
             
-            credentials = pika.PlainCredentials(username, password)
-            parameters = pika.ConnectionParameters(
-                host=host,
-                port=port,
-                virtual_host=vhost,
-                credentials=credentials,
-                socket_timeout=10,  # 设置socket超时
-                connection_attempts=1,  # 只尝试一次，避免自动重试
-                retry_delay=0,  # 不延迟重试
+        Returns:
+            IP地址，无法解析时返回 None
+        """
+        # 已经是IP地址（如 docker-compose 中直接配置IP）时无需解析
+        try:
+            ipaddress.ip_address(host)
+            return host
+        except ValueError:
+            pass
+        
+        now = time.monotonic()
+        cached = self._dns_cache.get(host)
+        if cached is not None:
+            ip, resolved_at = cached
+            ttl = DNS_CACHE_TTL_SECONDS if ip is not None else DNS_NEGATIVE_CACHE_TTL_SECONDS
+            if now - resolved_at < ttl:
+                return ip
+        
+        try:
+            infos = socket.getaddrinfo(host, None, socket.AF_INET, socket.SOCK_STREAM, 0, socket.AI_ADDRCONFIG)
+            ip = infos[0][4][0]
+            logger.info("[PYCA] DNS resolution for '%s': %s", host, ip)
+        except (socket.gaierror, IndexError) as e:
+            ip = None
+            logger.error("[PYCA] ERROR: Cannot resolve hostname '%s' from URL '%s'. DNS error: %s", host, self.rabbitmq_url, e)
+        self._dns_cache[host] = (ip, now)
+        return ip
+    
+    def _open_channel(self):
+        """
+        建立新的 RabbitMQ 连接和 channel，并声明 exchange
+        
+        Returns:
+            (connection, channel)，配置无效或连接失败时返回 None（只记录日志，不抛出异常）
+        """
+        parameters = self._mq_params
+        if parameters is None:
+            logger.error("[PYCA] ERROR: RabbitMQ URL '%s' is invalid, cannot connect. Please check your configuration.", self.rabbitmq_url)
+            return None
+        host = self._mq_host
+        
+        # 连接RabbitMQ
+        logger.info("[PYCA] Connecting to RabbitMQ: host=%s, port=%s, vhost=%s", host, parameters.port, parameters.virtual_host)
+        
+        # 解析hostname（带缓存；避免DNS解析失败导致pika回退到localhost），
+        # 直接用解析出的IP建立连接，pika 不再重复解析
+        resolved = self._resolve_host(host)
+        if resolved is None:
+            # 不抛出异常，只记录日志
+            return None
+        parameters.host = resolved
+        
+        try:
+            connection = pika.BlockingConnection(parameters)
+        except Exception as conn_error:
+            # 连接失败，记录日志但不抛出；丢弃缓存的解析结果，下次重新解析（broker 可能已迁移）
+            self._dns_cache.pop(host, None)
+            logger.error("[PYCA] Failed to establish RabbitMQ connection: %s", conn_error)
+            return None
+        
+        try:
+            channel = connection.channel()
+            # 声明exchange（如果不存在），每个新 channel 只声明一次
+            channel.exchange_declare(
+                exchange='coverage_exchange',
+                exchange_type='topic',
+                durable=True
             )
-            
-            logger.info(f"[PYCA] Pika connection parameters: host={parameters.host}, port={parameters.port}, vhost={parameters.virtual_host}")
-            
-            # 连接操作可能抛出异常，需要确保在 try 块内
+            # 持久化消息使用事务：一批消息只在 tx_commit 时等待一次 broker 确认
+            if self.mq_durable:
+                channel.tx_select()
+        except Exception:
+            self._close_quietly(connection)
+            raise
+        
+        logger.info("[PYCA] RabbitMQ connection established, will be reused for subsequent reports")
+        return connection, channel
+    
+    def _ensure_channel(self):
+        """
+        获取可用的 channel，复用已有的连接；连接或 channel 已关闭、或连接已使用超过
+        MQ_CONNECTION_RECYCLE_SECONDS 时重新建立
+        
+        Returns:
+            pika channel，无法建立连接时返回 None
+        """
+        if (self._connection is not None and self._connection.is_open
+                and self._channel is not None and self._channel.is_open):
+            if time.monotonic() - self._connection_opened_at < MQ_CONNECTION_RECYCLE_SECONDS:
+                return self._channel
+            logger.info("[PYCA] RabbitMQ connection reached its %ds lifetime, reconnecting", MQ_CONNECTION_RECYCLE_SECONDS)
+        
+        self._close_connection()
+        opened = self._open_channel()
+        if opened is None:
+            return None
+        self._connection, self._channel = opened
+        self._connection_opened_at = time.monotonic()
+        return self._channel
+    
+    def _process_connection_events(self):
+        """处理已有连接上积压的事件并发送心跳，连接已不可用时丢弃（下次发布时重连）"""
+        if self._connection is None:
+            return
+        try:
+            self._connection.process_data_events(time_limit=0)
+        except Exception as e:
+            logger.info("[PYCA] RabbitMQ connection is no longer usable, reconnecting: %s", e)
+            self._close_connection()
+    
+    def _close_connection(self):
+        """关闭并丢弃当前的 RabbitMQ 连接"""
+        connection = self._connection
+        self._connection = None
+        self._channel = None
+        if connection is not None:
+            self._close_quietly(connection)
+    
+    @staticmethod
+    def _close_quietly(connection):
+        """关闭连接，忽略关闭过程中的任何异常"""
+        try:
+            # 检查连接状态时也可能抛出异常，需要额外保护
             try:
-                connection = pika.BlockingConnection(parameters)
-            except Exception as conn_error:
-                # 连接失败，记录日志但不抛出
-                logger.error(f"[PYCA] Failed to establish RabbitMQ connection: {conn_error}")
-                logger.warning("[PYCA] Coverage report failed, but continuing service execution (non-blocking)")
-                return  # 直接返回，不继续执行
+                is_closed = connection.is_closed
+            except Exception:
+                is_closed = True  # 如果无法检查状态，假设已关闭
             
-            try:
-                channel = connection.channel()
-                
-                # 声明exchange（如果不存在）
-                channel.exchange_declare(
-                    exchange='coverage_exchange',
-                    exchange_type='topic',
-                    durable=True
-                )
-                
-                # 发布消息
-                message_body = json.dumps(report)
-                channel.basic_publish(
-                    exchange='coverage_exchange',
-                    routing_key='coverage.report',
-                    body=message_body,
-                    properties=pika.BasicProperties(
-                        content_type='application/json',
-                        delivery_mode=2  # 持久化
-                    )
-                )
-                
-                logger.info(f"[PYCA] Coverage report published successfully: repo={report.get('repo')}, "
-                           f"branch={report.get('branch')}, commit={report.get('commit')}")
-            finally:
-                # 确保连接被关闭（在内部 try-finally 中）
+            if not is_closed:
+                connection.close()
+        except Exception as e:
+            # 关闭连接时的异常也不应该影响服务
+            logger.debug("[PYCA] Error closing connection: %s", e)
+    
+    def _publish_to_mq(self, reports: List[Dict]):
+        """发布一批消息到RabbitMQ，每个报告一条消息
+        
+        连接和 channel 在多次上报之间复用，只在断开后重新建立；发布失败时重连并重试一次（只重发未发布成功的消息）
+        
+        注意：此方法捕获所有异常并记录日志，不会抛出异常，确保上报失败不会影响被测服务
+        """
+        try:
+            # 处理已有连接上积压的事件（心跳等），及时发现已被 broker 关闭的连接
+            self._process_connection_events()
+            
+            # 每个报告整体作为一条消息，按配置压缩
+            bodies = []
+            for report in reports:
+                message_body = _dumps_json_bytes(report)
+                if self.mq_compression == 'gzip':
+                    message_body = gzip.compress(message_body)
+                bodies.append(message_body)
+            properties = self._mq_properties
+            
+            published = 0
+            for attempt in (1, 2):
+                channel = self._ensure_channel()
+                if channel is None:
+                    logger.warning("[PYCA] Coverage report failed, but continuing service execution (non-blocking)")
+                    return
                 try:
-                    if connection is not None:
-                        connection.close()
-                        connection = None  # 标记已关闭，避免外层 finally 重复关闭
-                except Exception as close_error:
-                    logger.debug(f"[PYCA] Error closing connection after publish: {close_error}")
+                    published += self._do_publish(bodies[published:], channel, properties, self.mq_durable)
+                    break
+                except _PublishInterrupted as e:
+                    # 复用的连接可能已失效，丢弃后重连重试一次
+                    published += e.published
+                    self._close_connection()
+                    if attempt == 2:
+                        raise e.__cause__
+                    logger.warning("[PYCA] Publish failed on existing RabbitMQ connection, reconnecting: %s", e.__cause__)
+            
+            for report, message_body in zip(reports, bodies):
+                logger.info("[PYCA] Coverage report published successfully: repo=%s, branch=%s, commit=%s, %d bytes",
+                            report.get('repo'), report.get('branch'), report.get('commit'), len(message_body))
         
         except Exception as e:
             # 捕获所有异常，记录日志但不抛出，确保不影响被测服务
-            logger.error(f"[PYCA] Failed to publish to MQ: {e}", exc_info=True)
+            logger.error("[PYCA] Failed to publish to MQ: %s", e, exc_info=True)
             logger.warning("[PYCA] Coverage report failed, but continuing service execution (non-blocking)")
-        finally:
-            # 确保连接被正确关闭（使用额外的异常保护）
-            if connection is not None:
-                try:
-                    # 检查连接状态时也可能抛出异常，需要额外保护
-                    try:
-                        is_closed = connection.is_closed
-                    except Exception:
-                        is_closed = True  # 如果无法检查状态，假设已关闭
-                    
-                    if not is_closed:
-                        connection.close()
-                except Exception as e:
-                    # 关闭连接时的异常也不应该影响服务
-                    logger.debug(f"[PYCA] Error closing connection: {e}")
+    
+    @staticmethod
+    def _do_publish(bodies: List[bytes], channel, properties, transactional: bool = False) -> int:
+        """
+        在同一个 channel 上依次发布消息
+        
+        Args:
+            transactional: channel 已开启事务（tx_select）时为 True，发布完整批消息后 tx_commit 一次
+        
+        Returns:
+            发布的消息数
+            
+        Raises:
+            _PublishInterrupted: 发布过程中出现 AMQP 错误，携带出错前已发布的消息数
+                （事务模式下未提交的消息随 channel 关闭而丢弃，已发布数为0，整批重发）
+        """
+        for index, body in enumerate(bodies):
+            try:
+                channel.basic_publish(
+                    exchange='coverage_exchange',
+                    routing_key='coverage.report',
+                    body=body,
+                    properties=properties
+                )
+            except pika.exceptions.AMQPError as e:
+                raise _PublishInterrupted(0 if transactional else index) from e
+        if transactional:
+            try:
+                channel.tx_commit()
+            except pika.exceptions.AMQPError as e:
+                raise _PublishInterrupted(0) from e
+        return len(bodies)
 
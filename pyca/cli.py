@@ -5,15 +5,17 @@ import sys
 import argparse
 import logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - [PYCA] - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 
 def main():
     """CLI入口"""
+    # 只有作为命令行工具运行时才配置日志输出
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - [PYCA] - %(levelname)s - %(message)s'
+    )
+    
     parser = argparse.ArgumentParser(description='PYCA (Python Coverage Agent) CLI')
     subparsers = parser.add_subparsers(dest='command', help='Commands')
     
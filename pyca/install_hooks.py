@@ -1,33 +1,33 @@
 """
 安装钩子 - 在安装时生成 .pth 和 sitecustomize.py
 """
-import os
-import sys
 import site
+import functools
+import sysconfig
 from pathlib import Path
 
 
+@functools.lru_cache(maxsize=1)
 def get_site_packages_dir():
-    """获取site-packages目录"""
-    # 获取所有site-packages目录
-    site_packages = site.getsitepackages()
-    if site_packages:
-        return site_packages[0]
-    
-    # 如果getsitepackages()返回空，尝试从sys.path获取
-    for path in sys.path:
-        if 'site-packages' in path:
-            return path
+    """获取site-packages目录（pip安装纯Python包的purelib目录）"""
+    purelib = sysconfig.get_paths().get('purelib')
+    if purelib:
+        return purelib
     
-    # 最后尝试从distutils获取
+    # sysconfig 未给出purelib时，退回到site的site-packages列表
+    site_packages = site.getsitepackages()
+    return site_packages[0] if site_packages else None
+
+
+def read_sitecustomize_template() -> bytes:
+    """读取随pyca包一起打包的 sitecustomize.py 模板"""
     try:
-        from distutils.sysconfig import get_python_lib
-        return get_python_lib()
+        from importlib.resources import files
     except ImportError:
-        # Python 3.12+ 移除了distutils
-        # 使用site-packages的默认位置
-        import site
-        return site.getsitepackages()[0] if site.getsitepackages() else None
+        # Python 3.7/3.8 没有 importlib.resources.files
+        from importlib.resources import read_binary
+        return read_binary('pyca', 'sitecustomize.py')
+    return files('pyca').joinpath('sitecustomize.py').read_bytes()
 
 
 def install_hooks():
@@ -51,83 +51,9 @@ def install_hooks():
     # 2. 创建 sitecustomize.py 文件
     sitecustomize_file = site_packages_path / "sitecustomize.py"
     
-    # 读取模板
-    sitecustomize_template = Path(__file__).parent / "sitecustomize.py"
-    if sitecustomize_template.exists():
-        # 复制sitecustomize.py到site-packages
-        import shutil
-        shutil.copy2(sitecustomize_template, sitecustomize_file)
-        print(f"Created sitecustomize.py: {sitecustomize_file}")
-    else:
-        # 如果模板不存在，创建一个简单的版本
-        sitecustomize_content = '''"""
-sitecustomize.py - Python sitecustomize钩子
-这个文件会被Python解释器自动加载，用于启动PCA agent
-"""
-import os
-import sys
-import logging
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - [PYCA] - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-def _is_pip_install_context():
-    """
-    检测是否在pip install过程中
-    返回True表示在安装过程中，应该跳过启动agent
-    """
-    # 检查sys.argv[0]是否包含setup.py或pip
-    if len(sys.argv) > 0:
-        script_name = sys.argv[0].lower()
-        if 'setup.py' in script_name or 'pip' in script_name:
-            return True
-    
-    # 检查环境变量（pip会设置这些变量）
-    if os.getenv('PIP_INSTALL') or os.getenv('PIP_REQ_TRACKER'):
-        return True
-    
-    # 检查是否在setup.py的执行上下文中
-    # 通过检查调用栈来判断
-    import traceback
-    stack = traceback.extract_stack()
-    for frame in stack:
-        filename = frame.filename.lower()
-        if 'setup.py' in filename or 'pip' in filename:
-            return True
-    
-    return False
-
-# 检查是否启用PYCA（支持PCA_*向后兼容）
-PYCA_ENABLED = os.getenv('PYCA_ENABLED') or os.getenv('PCA_ENABLED', '1')
-PYCA_ENABLED = PYCA_ENABLED.lower() in ('1', 'true', 'yes', 'on')
-
-# 检查是否在pip install过程中
-if _is_pip_install_context():
-    logger.debug("[PYCA] Detected pip install context, skipping agent startup")
-    PYCA_ENABLED = False
-
-if PYCA_ENABLED:
-    try:
-        # 导入agent模块
-        from pyca.agent import CoverageAgent
-        
-        # 创建并启动agent
-        agent = CoverageAgent()
-        agent.start()
-        
-        logger.info("[PYCA] Coverage agent started via sitecustomize")
-    except Exception as e:
-        logger.error(f"[PYCA] Failed to start coverage agent: {e}", exc_info=True)
-else:
-    logger.debug("[PYCA] Coverage agent disabled (PYCA_ENABLED=0 or PCA_ENABLED=0)")
-'''
-        with open(sitecustomize_file, 'w') as f:
-            f.write(sitecustomize_content)
-        print(f"Created sitecustomize.py: {sitecustomize_file}")
+    # 复制打包在pyca中的sitecustomize.py到site-packages
+    sitecustomize_file.write_bytes(read_sitecustomize_template())
+    print(f"Created sitecustomize.py: {sitecustomize_file}")
     
     print("Installation hooks installed successfully!")
 
@@ -4,51 +4,54 @@ sitecustomize.py - Python sitecustomize钩子
 """
 import os
 import sys
-import logging
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - [PYCA] - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+# 安装过程的入口脚本名（sys.argv[0] 的文件名，pip 另外匹配 pip3、pip3.11 等带版本号的名字）
+_INSTALL_SCRIPT_NAMES = frozenset({'setup.py', 'pip', 'build'})
+
+# pip 及构建后端在安装过程中（包括其子进程）设置的环境变量
+_INSTALL_ENV_VARS = ('PIP_INSTALL', 'PIP_REQ_TRACKER', 'PIP_BUILD_TRACKER', '_PYPROJECT_HOOKS_BUILD_BACKEND')
 
 def _is_pip_install_context():
     """
     检测是否在pip install过程中
     返回True表示在安装过程中，应该跳过启动agent
+    
+    每个Python进程启动时都会执行，只做常数时间的 argv / 环境变量检查，不遍历调用栈
     """
-    # 检查sys.argv[0]是否包含setup.py或pip
-    if len(sys.argv) > 0:
-        script_name = sys.argv[0].lower()
-        if 'setup.py' in script_name or 'pip' in script_name:
+    # 检查sys.argv[0]是否为setup.py或pip等安装脚本（Windows 下为 pip.exe 等）
+    if sys.argv:
+        script_name = os.path.basename(sys.argv[0]).lower()
+        if script_name.endswith('.exe'):
+            script_name = script_name[:-4]
+        if script_name in _INSTALL_SCRIPT_NAMES:
             return True
-    
-    # 检查环境变量（pip会设置这些变量）
-    if os.getenv('PIP_INSTALL') or os.getenv('PIP_REQ_TRACKER'):
-        return True
-    
-    # 检查是否在setup.py的执行上下文中
-    # 通过检查调用栈来判断
-    import traceback
-    stack = traceback.extract_stack()
-    for frame in stack:
-        filename = frame.filename.lower()
-        if 'setup.py' in filename or 'pip' in filename:
+        if script_name.startswith('pip') and not script_name[3:].strip('0123456789.'):
             return True
     
-    return False
+    # 检查环境变量（pip会设置这些变量）
+    return any(os.getenv(name) for name in _INSTALL_ENV_VARS)
 
 # 检查是否启用PYCA（支持PCA_*向后兼容）
+# 每个Python进程启动时都会执行：未启用时直接结束，不导入logging，也不做其他检查
 PYCA_ENABLED = os.getenv('PYCA_ENABLED') or os.getenv('PCA_ENABLED', '1')
 PYCA_ENABLED = PYCA_ENABLED.lower() in ('1', 'true', 'yes', 'on')
 
-# 检查是否在pip install过程中
-if _is_pip_install_context():
-    logger.debug("[PYCA] Detected pip install context, skipping agent startup")
+# 检查是否在pip install过程中，安装过程中跳过启动agent
+if PYCA_ENABLED and _is_pip_install_context():
     PYCA_ENABLED = False
 
 if PYCA_ENABLED:
+    import logging
+    
+    # 配置日志：只给pyca的logger添加输出，不修改宿主进程的根logger
+    _pyca_logger = logging.getLogger('pyca')
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(asctime)s - [PYCA] - %(levelname)s - %(message)s'))
+    _pyca_logger.addHandler(_handler)
+    _pyca_logger.setLevel(logging.INFO)
+    _pyca_logger.propagate = False  # 避免宿主进程配置根logger后重复输出
+    logger = logging.getLogger('pyca.sitecustomize')
+    
     try:
         # 确保pyca包在路径中
         # 如果通过.pth文件加载，pyca应该已经在sys.path中
@@ -73,7 +76,5 @@ if PYCA_ENABLED:
         
         logger.info("[PYCA] Coverage agent started via sitecustomize")
     except Exception as e:
-        logger.error(f"[PYCA] Failed to start coverage agent: {e}", exc_info=True)
-else:
-    logger.debug("[PYCA] Coverage agent disabled (PYCA_ENABLED=0 or PCA_ENABLED=0)")
+        logger.error("[PYCA] Failed to start coverage agent: %s", e, exc_info=True)
 
@@ -4,12 +4,16 @@ Setup script for PYCA (Python Coverage Agent)
 from setuptools import setup, find_packages
 from setuptools.command.install import install
 from pathlib import Path
+import shutil
 import sys
 import site
 
-# 读取README
+# 读取README（只有打包/检查元数据的命令用到 long_description，pip 解析依赖时的其他调用跳过读取）
+_LONG_DESCRIPTION_COMMANDS = {"sdist", "bdist_wheel", "check"}
 readme_file = Path(__file__).parent / "README.md"
-long_description = readme_file.read_text(encoding='utf-8') if readme_file.exists() else ""
+long_description = ""
+if _LONG_DESCRIPTION_COMMANDS.intersection(sys.argv[1:]) and readme_file.exists():
+    long_description = readme_file.read_text(encoding='utf-8')
 
 
 class PostInstallHook(install):
@@ -55,83 +59,13 @@ class PostInstallHook(install):
             # 2. 创建 sitecustomize.py 文件
             sitecustomize_file = site_packages_path / "sitecustomize.py"
             
-            # 读取模板
-            sitecustomize_template = Path(__file__).parent / "pyca" / "sitecustomize.py"
-            if sitecustomize_template.exists():
-                # 复制sitecustomize.py到site-packages
-                import shutil
-                shutil.copy2(sitecustomize_template, sitecustomize_file)
-                print(f"[PYCA] Created sitecustomize.py: {sitecustomize_file}")
-            else:
-                # 如果模板不存在，创建一个简单的版本
-                sitecustomize_content = '''"""
-sitecustomize.py - Python sitecustomize钩子
-这个文件会被Python解释器自动加载，用于启动PYCA agent
-"""
-import os
-import sys
-import logging
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - [PYCA] - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-def _is_pip_install_context():
-    """
-    检测是否在pip install过程中
-    返回True表示在安装过程中，应该跳过启动agent
-    """
-    # 检查sys.argv[0]是否包含setup.py或pip
-    if len(sys.argv) > 0:
-        script_name = sys.argv[0].lower()
-        if 'setup.py' in script_name or 'pip' in script_name:
-            return True
-    
-    # 检查环境变量（pip会设置这些变量）
-    if os.getenv('PIP_INSTALL') or os.getenv('PIP_REQ_TRACKER'):
-        return True
-    
-    # 检查是否在setup.py的执行上下文中
-    # 通过检查调用栈来判断
-    import traceback
-    stack = traceback.extract_stack()
-    for frame in stack:
-        filename = frame.filename.lower()
-        if 'setup.py' in filename or 'pip' in filename:
-            return True
-    
-    return False
-
-# 检查是否启用PYCA（支持PCA_*向后兼容）
-PYCA_ENABLED = os.getenv('PYCA_ENABLED') or os.getenv('PCA_ENABLED', '1')
-PYCA_ENABLED = PYCA_ENABLED.lower() in ('1', 'true', 'yes', 'on')
-
-# 检查是否在pip install过程中
-if _is_pip_install_context():
-    logger.debug("[PYCA] Detected pip install context, skipping agent startup")
-    PYCA_ENABLED = False
-
-if PYCA_ENABLED:
-    try:
-        # 导入agent模块
-        from pyca.agent import CoverageAgent
-        
-        # 创建并启动agent
-        agent = CoverageAgent()
-        agent.start()
-        
-        logger.info("[PYCA] Coverage agent started via sitecustomize")
-    except Exception as e:
-        logger.error(f"[PYCA] Failed to start coverage agent: {e}", exc_info=True)
-else:
-    logger.debug("[PYCA] Coverage agent disabled (PYCA_ENABLED=0 or PCA_ENABLED=0)")
-'''
-                with open(sitecustomize_file, 'w') as f:
-                    f.write(sitecustomize_content)
-                print(f"[PYCA] Created sitecustomize.py: {sitecustomize_file}")
+            # 复制刚安装的pyca包中的sitecustomize.py到site-packages
+            # （setup.py 运行时 pyca 不一定可导入，且可能导入到旧版本，因此按路径读取）
+            sitecustomize_template = pyca_package_path / "sitecustomize.py"
+            if not sitecustomize_template.exists():
+                sitecustomize_template = Path(__file__).parent / "pyca" / "sitecustomize.py"
+            shutil.copyfile(sitecustomize_template, sitecustomize_file)
+            print(f"[PYCA] Created sitecustomize.py: {sitecustomize_file}")
             
             print("[PYCA] Installation hooks installed successfully!")
         
@@ -156,6 +90,9 @@ setup(
         "pika>=1.3.0",
         "python-dotenv>=1.0.0",
     ],
+    extras_require={
+        "fast": ["orjson>=3.0.0", "numpy>=1.17"],
+    },
     python_requires=">=3.7",
     classifiers=[
         "Development Status :: 4 - Beta",
@@ -177,6 +114,7 @@ setup(
     cmdclass={
         'install': PostInstallHook,
     },
+    package_data={"pyca": ["sitecustomize.py"]},
     include_package_data=True,
     zip_safe=False,
 )